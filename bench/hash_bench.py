@@ -0,0 +1,76 @@
+#!/bin/env python3
+"""
+Micro-benchmark for flag verification.
+
+Prints the per-verify latency of each hash scheme and the worst event-loop
+lag seen while verifying, once with hashing run inline on the loop and once
+through FlagHasher's thread pool.
+
+    python bench/hash_bench.py [verifies]
+"""
+
+import asyncio, statistics, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+from hashing import FlagHasher, legacy_hash, parse_scrypt, scrypt_hash  # noqa: E402
+
+FLAG = "flag{benchmarking_is_fun}"
+
+
+async def lag_monitor(samples, interval=0.005):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - start - interval)
+
+
+async def measure(name, verify, count):
+    lags = []
+    monitor = asyncio.create_task(lag_monitor(lags))
+    await asyncio.sleep(0.05)
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(count):
+        begin = time.perf_counter()
+        await verify()
+        latencies.append(time.perf_counter() - begin)
+        await asyncio.sleep(0)  # let the monitor see how long we blocked
+    total = time.perf_counter() - start
+    await asyncio.sleep(0.02)
+    monitor.cancel()
+
+    latencies.sort()
+    print(
+        f"{name:<22} {count / total:8.1f} verifies/s  "
+        f"p50 {1000 * statistics.median(latencies):8.2f} ms  "
+        f"p99 {1000 * latencies[int(0.99 * (len(latencies) - 1))]:8.2f} ms  "
+        f"max loop lag {1000 * max(lags, default=0):8.2f} ms"
+    )
+
+
+async def main(count):
+    hasher = FlagHasher()
+    stored = await hasher.hash(FLAG)
+    legacy = legacy_hash(FLAG)
+
+    async def legacy_inline():
+        legacy_hash(FLAG) == legacy
+
+    async def scrypt_inline():
+        scrypt_hash(FLAG, *parse_scrypt(stored)) == stored
+
+    async def scrypt_pool():
+        await hasher.verify(FLAG, stored)
+
+    await measure("legacy, inline", legacy_inline, count)
+    await measure("scrypt, inline", scrypt_inline, count)
+    await measure("scrypt, thread pool", scrypt_pool, count)
+    hasher.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
@@ -0,0 +1,107 @@
+#!/bin/env python3
+"""
+Startup benchmark for src/main.py.
+
+Imports main.py in fresh interpreters under `python -X importtime` and
+prints the median total import time and the slowest modules it imports
+directly. Given a database URL it also times setup(): pool, migrations,
+flag cache and web server, the part that now runs during the gateway login.
+
+    python bench/startup_bench.py [database_url] [--runs 5]
+"""
+import argparse, logging, os, statistics, subprocess, sys, time
+from pathlib import Path
+
+SRC = Path(__file__).parents[1] / "src"
+
+# enough settings for main.py to import, nothing is contacted
+ENV = {
+    "TOKEN": "startup-bench",
+    "DATABASE_URL": "postgresql://localhost/startup-bench",
+    "PORT": "0",
+    "BOT_ERROR_LOG": "1",
+    "MOD_CHANNEL": "1",
+    "ADD_CHALLENGES_CHANNEL": "1",
+    "CHALLENGE_SOLVES_CHANNEL": "1",
+    "CHALLENGES_CHANNEL": "1",
+    "NEW_MEMBERS_CHANNEL": "1",
+    "EXISTING_MEMBERS_CHANNEL": "1",
+    "BOT_UPDATES_CHANNEL": "1",
+}
+
+
+def import_times(env):
+    """Return ({top-level module: cumulative µs}, total µs) for one import."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=SRC,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        if name.strip() == "main":
+            total = int(cumulative)
+        elif depth == 1:  # imported by main.py itself
+            modules[name.strip()] = int(cumulative)
+    return modules, total
+
+
+async def time_setup(app):
+    start = time.perf_counter()
+    await app.setup()
+    elapsed = time.perf_counter() - start
+
+    await app.bot.submission_log.close()
+    await app.bot.web.close()
+    await app.bot.scoreboard.close()
+    await app.bot.db.close()
+    app.bot.hasher.close()
+    return elapsed
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("database", nargs="?")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ, **ENV)
+    if args.database:
+        env["DATABASE_URL"] = args.database
+
+    runs = [import_times(env) for _ in range(args.runs)]
+    totals = [total for _, total in runs]
+    print(
+        f"import main: median {statistics.median(totals) / 1000:.1f} ms, "
+        f"min {min(totals) / 1000:.1f} ms over {args.runs} runs"
+    )
+    medians = {
+        name: statistics.median(modules.get(name, 0) for modules, _ in runs)
+        for name in runs[0][0]
+    }
+    for name, cumulative in sorted(medians.items(), key=lambda item: -item[1])[
+        : args.top
+    ]:
+        print(f"  {name:<24} {cumulative / 1000:>8.1f} ms")
+
+    if args.database:
+        os.environ.update(env)
+        sys.path.insert(0, str(SRC))
+        import main as app
+
+        logging.getLogger().setLevel(logging.WARNING)
+        elapsed = app.bot.loop.run_until_complete(time_setup(app))
+        print(f"setup(): {1000 * elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,344 @@
+#!/bin/env python3
+import asyncio, json, logging, time
+from collections import deque
+
+import nextcord
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+# NOTIFY channel that wakes the sending worker when announcements are queued
+ANNOUNCE_CHANNEL = "announcements"
+
+# Discord's limits for the embeds of one message
+MAX_EMBEDS = 10
+MAX_EMBED_CHARS = 6000
+
+
+def embed_batches(embeds):
+    """Split embeds into lists that each fit in one message."""
+    batch, chars = [], 0
+    for embed in embeds:
+        if batch and (len(batch) == MAX_EMBEDS or chars + len(embed) > MAX_EMBED_CHARS):
+            yield batch
+            batch, chars = [], 0
+        batch.append(embed)
+        chars += len(embed)
+    if batch:
+        yield batch
+
+
+class _Pending:
+    __slots__ = ("content", "embeds", "solve", "enqueued_on")
+
+    def __init__(self, content=None, embeds=None, solve=False):
+        self.content = content
+        self.embeds = embeds
+        self.solve = solve
+        self.enqueued_on = time.monotonic()
+
+
+class Announcer:
+    """
+    Sends bot announcements from background tasks, one queue per channel.
+
+    Handlers call `send()`/`solve()` and return immediately, so waiting on a
+    Discord rate limit never holds up a command. Solve notices arriving within
+    `solve_window` seconds of each other are merged into a single message.
+    """
+
+    MAX_LINES = 20  # solve notices per merged message
+    MAX_QUEUE = 1000  # per channel, the oldest messages are dropped beyond this
+
+    def __init__(self, *, solve_window=2.0):
+        self.solve_window = solve_window
+        self._queues = {}  # channel id -> (channel, deque, wake event)
+        self._tasks = {}
+        self._in_flight = 0  # taken off a queue but not delivered yet
+
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.rate_limited = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def send(self, channel, content=None, *, embed=None, embeds=None):
+        """Queue a message with an embed or a list of them (see embed_batches)."""
+        if embed is not None:
+            embeds = [embed]
+        self._put(channel, _Pending(content, embeds))
+
+    def solve(self, channel, text):
+        self._put(channel, _Pending(text, solve=True))
+
+    def _put(self, channel, item):
+        if channel.id not in self._queues:
+            self._queues[channel.id] = (channel, deque(), asyncio.Event())
+        task = self._tasks.get(channel.id)
+        if task is None or task.done():  # a worker that died would strand the queue
+            if task is not None and not task.cancelled():
+                log.error(
+                    "announcer for %s stopped", channel, exc_info=task.exception()
+                )
+            self._tasks[channel.id] = asyncio.create_task(self._run(channel.id))
+
+        _, pending, wake = self._queues[channel.id]
+        if len(pending) >= self.MAX_QUEUE:
+            pending.popleft()
+            self.dropped += 1
+        pending.append(item)
+        wake.set()
+
+    async def _run(self, channel_id):
+        channel, pending, wake = self._queues[channel_id]
+        while True:
+            if not pending:
+                wake.clear()
+                await wake.wait()
+                continue
+
+            first = pending[0]
+            if not first.solve:
+                pending.popleft()
+                self._in_flight += 1
+                await self._deliver(channel, [first], first.content, first.embeds)
+                continue
+
+            # give other solves a moment to arrive and merge them
+            delay = first.enqueued_on + self.solve_window - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            batch = []
+            while pending and pending[0].solve and len(batch) < self.MAX_LINES:
+                batch.append(pending.popleft())
+            self._in_flight += 1
+            await self._deliver(
+                channel, batch, "\n".join(item.content for item in batch), None
+            )
+
+    async def _deliver(self, channel, items, content, embeds):
+        try:
+            for attempt in range(3):
+                start = time.perf_counter()
+                try:
+                    await channel.send(content=content, embeds=embeds)
+                except nextcord.HTTPException as error:
+                    if error.status != 429:
+                        log.exception("announcement to %s failed", channel)
+                        break
+                    self.rate_limited += 1
+                    metrics.discord_rate_limits.inc()
+                    await asyncio.sleep(2**attempt)
+                except (OSError, asyncio.TimeoutError):  # lost connection to Discord
+                    log.exception("announcement to %s failed", channel)
+                    await asyncio.sleep(2**attempt)
+                except Exception:
+                    log.exception("announcement to %s failed", channel)
+                    break
+                else:
+                    metrics.discord_send_seconds.observe(time.perf_counter() - start)
+                    self.sent += 1
+                    lag = time.monotonic() - items[0].enqueued_on
+                    self.last_lag = lag
+                    self.max_lag = max(self.max_lag, lag)
+                    return
+            self.failed += 1
+        finally:
+            self._in_flight -= 1
+
+    @property
+    def depth(self):
+        return sum(len(pending) for _, pending, _ in self._queues.values())
+
+    def stats(self):
+        return {
+            "queue_depth": self.depth,
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "rate_limited": self.rate_limited,
+            "last_lag_ms": round(1000 * self.last_lag, 2),
+            "max_lag_ms": round(1000 * self.max_lag, 2),
+        }
+
+    async def close(self, timeout=10):
+        """Send what is still queued, then stop the workers."""
+        deadline = time.monotonic() + timeout
+        while (self.depth or self._in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        self._queues.clear()
+
+
+class Outbox:
+    """
+    Announcements of several bot workers, queued in the `announcements` table.
+
+    `send()`/`solve()` work like Announcer's, but messages are written to
+    Postgres in batches. One worker (`announcer` given) claims the rows with
+    SKIP LOCKED and passes them to its Announcer, so solves from every shard
+    are merged and each channel has a single sender. Claimed rows are deleted:
+    like the in-memory queues, delivery is at most once.
+    """
+
+    MAX_BATCH = 100
+    POLL_INTERVAL = 5  # seconds, in case a notification was missed
+
+    def __init__(self, db, announcer=None, *, get_channel=None):
+        self.db = db
+        self.announcer = announcer
+        self.get_channel = get_channel  # async channel id -> channel
+        self._pending = deque()
+        self._wake = asyncio.Event()
+        self._ready = asyncio.Event()  # rows may be waiting in the table
+        self._writer = None
+        self._dispatcher = None
+        self._writing = 0
+
+        self.queued = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def send(self, channel, content=None, *, embed=None, embeds=None):
+        if embed is not None:
+            embeds = [embed]
+        if embeds:
+            embeds = json.dumps([embed.to_dict() for embed in embeds])
+        self._put((channel.id, False, content, embeds or None))
+
+    def solve(self, channel, text):
+        self._put((channel.id, True, text, None))
+
+    def _put(self, row):
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write())
+        if len(self._pending) >= Announcer.MAX_QUEUE:
+            self._pending.popleft()
+            self.dropped += 1
+        self._pending.append(row)
+        self._wake.set()
+
+    async def _write(self):
+        while True:
+            if not self._pending:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+
+            batch = []
+            while self._pending and len(batch) < self.MAX_BATCH:
+                batch.append(self._pending.popleft())
+            self._writing = len(batch)
+            try:
+                async with self.db.acquire() as conn:
+                    async with conn.transaction():
+                        await conn.execute(
+                            """
+                            INSERT INTO announcements (channel_id, solve, content, embed)
+                                SELECT * FROM unnest(
+                                    $1::BIGINT[], $2::BOOLEAN[], $3::TEXT[], $4::JSONB[]
+                                )
+                            """,
+                            *zip(*batch),
+                        )
+                        await conn.execute("SELECT pg_notify($1, '')", ANNOUNCE_CHANNEL)
+                self.queued += len(batch)
+            except Exception:
+                log.exception("queueing %d announcements failed", len(batch))
+                self.failed += len(batch)
+            finally:
+                self._writing = 0
+
+    async def start(self):
+        """Start sending queued announcements, if this is the sending worker."""
+        if self.announcer is None or self._dispatcher is not None:
+            return
+        await self.db.listen(ANNOUNCE_CHANNEL, lambda payload: self._ready.set())
+        self._ready.set()  # whatever was queued while no worker was sending
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._ready.wait(), self.POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._ready.clear()
+            try:
+                while await self._claim() == self.MAX_BATCH:
+                    pass
+            except Exception:
+                log.exception("claiming announcements failed")
+
+    async def _claim(self):
+        async with self.db.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                DELETE FROM announcements
+                    WHERE announcement_id IN (
+                        SELECT announcement_id
+                            FROM announcements
+                                ORDER BY announcement_id
+                                    LIMIT $1
+                                        FOR UPDATE SKIP LOCKED
+                    )
+                RETURNING announcement_id, channel_id, solve, content, embed
+                """,
+                self.MAX_BATCH,
+            )
+
+        for row in sorted(rows, key=lambda row: row["announcement_id"]):
+            try:
+                await self._queue(row)
+            except Exception:  # the row is already claimed, only it is lost
+                log.exception("dropped announcement %s", row["announcement_id"])
+                self.announcer.failed += 1
+        return len(rows)
+
+    async def _queue(self, row):
+        channel = await self.get_channel(row["channel_id"])
+        if row["solve"]:
+            self.announcer.solve(channel, row["content"])
+        else:
+            embeds = json.loads(row["embed"]) if row["embed"] else []
+            if isinstance(embeds, dict):  # queued before embed lists
+                embeds = [embeds]
+            self.announcer.send(
+                channel,
+                row["content"],
+                embeds=[nextcord.Embed.from_dict(embed) for embed in embeds] or None,
+            )
+
+    @property
+    def depth(self):
+        depth = len(self._pending) + self._writing
+        if self.announcer is not None:
+            depth += self.announcer.depth
+        return depth
+
+    def stats(self):
+        stats = {
+            "outbox_depth": len(self._pending) + self._writing,
+            "queued": self.queued,
+            "queue_failed": self.failed,
+            "queue_dropped": self.dropped,
+        }
+        if self.announcer is not None:
+            stats.update(self.announcer.stats())
+        return stats
+
+    async def close(self, timeout=10):
+        """Queue what is still pending, then stop. Unsent rows wait in the table."""
+        deadline = time.monotonic() + timeout
+        while (self._pending or self._writing) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        for task in (self._writer, self._dispatcher):
+            if task is not None:
+                task.cancel()
+        self._writer = self._dispatcher = None
+        if self.announcer is not None:
+            await self.announcer.close(max(0, deadline - time.monotonic()))
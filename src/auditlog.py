@@ -0,0 +1,148 @@
+#!/bin/env python3
+import asyncio, logging, time
+
+import asyncpg
+
+log = logging.getLogger(__name__)
+
+# errors caused by the records themselves rather than by the connection
+BAD_RECORD = (
+    asyncpg.DataError,
+    asyncpg.IntegrityConstraintViolationError,
+    TypeError,
+    ValueError,
+)
+
+
+class SubmissionLog:
+    """
+    Write-behind queue for the `submissions` audit log.
+
+    Handlers hand over a record and return straight away; a background task
+    writes the records in bulk with COPY once `max_batch` of them are queued or
+    `flush_interval` seconds have passed. When the queue is full `add()` waits,
+    which slows submitters down instead of growing memory without bound.
+    """
+
+    COLUMNS = ("challenge_id", "member_id", "submitted_flags", "added_on", "message_id")
+
+    def __init__(
+        self, db, *, max_batch=500, flush_interval=2.0, max_queue=10000, on_flush=None
+    ):
+        self.db = db
+        self.on_flush = on_flush  # called after every successful write
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+
+        self.flushed = 0
+        self.dropped = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def depth(self):
+        return self.queue.qsize()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            self._task.add_done_callback(self._restart)
+
+    def _restart(self, task):
+        """Keep the only writer alive, or `add()` ends up waiting forever."""
+        if task.cancelled() or task is not self._task:
+            return
+        log.error("submission writer stopped, restarting", exc_info=task.exception())
+        self._task = None
+        self.start()
+
+    async def add(self, challenge_id, member_id, submitted_flag, added_on, message_id):
+        await self.queue.put(
+            (challenge_id, member_id, submitted_flag, added_on, message_id)
+        )
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._write(batch)
+            except Exception:
+                self.dropped += len(batch)
+                log.exception("dropped %d submissions: %r", len(batch), batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _copy(self, records):
+        start = time.perf_counter()
+        async with self.db.acquire() as conn:
+            await conn.copy_records_to_table(
+                "submissions", records=records, columns=self.COLUMNS
+            )
+        self.flushed += len(records)
+        self.last_flush_ms = round(1000 * (time.perf_counter() - start), 2)
+        if self.on_flush is not None:
+            self.on_flush()
+
+    async def _write(self, batch, retries=3):
+        for attempt in range(1, retries + 1):
+            try:
+                await self._copy(batch)
+                return
+            except BAD_RECORD:
+                log.exception("writing %d submissions failed", len(batch))
+                break  # retrying the same records fails the same way
+            except Exception:
+                log.exception(
+                    "writing %d submissions failed (attempt %d/%d)",
+                    len(batch),
+                    attempt,
+                    retries,
+                )
+                await asyncio.sleep(attempt)
+
+        # one record can fail a whole COPY, so lose only the ones that fail alone
+        dropped = []
+        for i, record in enumerate(batch):
+            try:
+                await self._copy([record])
+            except BAD_RECORD:
+                dropped.append(record)
+            except Exception:
+                log.exception("writing submissions failed")
+                dropped.extend(batch[i:])  # the database, not the records
+                break
+        if dropped:
+            self.dropped += len(dropped)
+            log.error("dropped %d submissions: %r", len(dropped), dropped)
+
+    def stats(self):
+        return {
+            "queue_depth": self.depth,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+    async def close(self, timeout=30):
+        """Flush everything that is still queued, then stop the writer."""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            log.error("gave up flushing %d queued submissions", self.depth)
+        self._task.cancel()
+        self._task = None
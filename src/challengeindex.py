@@ -0,0 +1,151 @@
+#!/bin/env python3
+import asyncio, logging, re
+from bisect import bisect_left, insort
+
+log = logging.getLogger(__name__)
+
+# NOTIFY channel used whenever challenges are added or published, the
+# payload is their comma separated ids or empty for "reload everything"
+INDEX_CHANNEL = "challenge_index"
+
+MAX_CHOICES = 25  # Discord shows at most 25 autocomplete choices
+MAX_WORDS = 20  # words of a description that are searchable
+
+
+class _Challenge:
+    __slots__ = ("challenge_id", "author_id", "category", "description", "published")
+
+    def __init__(self, row):
+        self.challenge_id = row["challenge_id"]
+        self.author_id = row["author_id"]
+        self.category = row["category"]
+        self.description = row["challenge_description"]
+        self.published = row["published_on"] is not None
+
+    def keys(self):
+        words = re.findall(r"\w+", self.description.lower())[:MAX_WORDS]
+        return {str(self.challenge_id), self.category.lower(), *words}
+
+    @property
+    def label(self):
+        """Autocomplete choice name, Discord allows 100 characters."""
+        label = f"{self.challenge_id} · {self.category} · {self.description}"
+        return label if len(label) <= 100 else label[:99] + "…"
+
+
+class ChallengeIndex:
+    """
+    Process-local prefix index of challenges for slash command autocomplete.
+
+    Every challenge is found by the prefixes of its id, its category and the
+    first words of its description, through a sorted list of (key, id)
+    pairs and bisect. It is filled at startup and kept in sync like
+    FlagCache, so autocomplete never reads the database. Whoever adds or
+    publishes challenges must call `notify()`.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.challenges = {}  # challenge_id -> _Challenge
+        self._keys = []  # sorted (key, challenge_id)
+
+    def search(self, text, *, published=None, author_id=None, limit=MAX_CHOICES):
+        """Challenges with a key starting with `text`, newest first if it is empty."""
+        prefix = text.strip().lower()
+
+        def wanted(challenge):
+            return (published is None or challenge.published == published) and (
+                author_id is None or challenge.author_id == author_id
+            )
+
+        if not prefix:
+            found = (
+                self.challenges[challenge_id]
+                for challenge_id in sorted(self.challenges, reverse=True)
+            )
+        else:
+            found = self._prefixed(prefix)
+        results, seen = [], set()
+        for challenge in found:
+            if wanted(challenge) and challenge.challenge_id not in seen:
+                seen.add(challenge.challenge_id)
+                results.append(challenge)
+                if len(results) == limit:
+                    break
+        return results
+
+    def _prefixed(self, prefix):
+        i = bisect_left(self._keys, (prefix,))
+        while i < len(self._keys) and self._keys[i][0].startswith(prefix):
+            yield self.challenges[self._keys[i][1]]
+            i += 1
+
+    def categories(self, text, limit=MAX_CHOICES):
+        prefix = text.strip().lower()
+        categories = sorted(
+            {
+                challenge.category
+                for challenge in self.challenges.values()
+                if challenge.published and challenge.category.lower().startswith(prefix)
+            }
+        )
+        return categories[:limit]
+
+    def _put(self, challenge):
+        self._remove(challenge.challenge_id)
+        self.challenges[challenge.challenge_id] = challenge
+        for key in challenge.keys():
+            insort(self._keys, (key, challenge.challenge_id))
+
+    def _remove(self, challenge_id):
+        old = self.challenges.pop(challenge_id, None)
+        if old is not None:
+            for key in old.keys():
+                del self._keys[bisect_left(self._keys, (key, challenge_id))]
+
+    async def load(self):
+        """(Re)load every challenge from the database."""
+        async with self.db.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT challenge_id, author_id, category, challenge_description, published_on
+                    FROM challenges
+                """
+            )
+        self.challenges = {row["challenge_id"]: _Challenge(row) for row in rows}
+        self._keys = sorted(
+            (key, challenge_id)
+            for challenge_id, challenge in self.challenges.items()
+            for key in challenge.keys()
+        )
+        log.info("challenge index loaded %d challenges", len(self.challenges))
+
+    async def refresh(self, challenge_ids):
+        """Re-read challenges after a replica added or published them."""
+        async with self.db.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT challenge_id, author_id, category, challenge_description, published_on
+                    FROM challenges
+                        WHERE challenge_id = ANY($1::INT[])
+                """,
+                challenge_ids,
+            )
+        found = {row["challenge_id"] for row in rows}
+        for challenge_id in challenge_ids:
+            if challenge_id not in found:
+                self._remove(challenge_id)
+        for row in rows:
+            self._put(_Challenge(row))
+
+    async def notify(self, conn, challenge_ids):
+        """Tell every replica that these challenges changed (sent on commit)."""
+        await self.db.notify_ids(conn, INDEX_CHANNEL, challenge_ids)
+
+    async def listen(self):
+        """Follow challenges added and published by every replica."""
+        # notifications missed while disconnected are lost, so reload everything
+        await self.db.listen_ids(INDEX_CHANNEL, self._on_notify, self.load)
+
+    def _on_notify(self, challenge_ids):
+        asyncio.create_task(self.refresh(challenge_ids))
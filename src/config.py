@@ -0,0 +1,157 @@
+#!/bin/env python3
+import asyncio, json, os
+from dataclasses import MISSING, dataclass, fields
+
+import nextcord
+
+# channels the bot posts to or listens in, all required
+CHANNEL_FIELDS = (
+    "bot_error_log",  # used to send exceptions/errors raised
+    "mod_channel",  # used in -execute command
+    "add_challenges_channel",  # used in -add challenge command
+    "challenge_solves_channel",  # used to send updates about challenge solves
+    "challenges_channel",  # used to publish challanges
+    "new_members_channel",
+    "existing_members_channel",
+    "bot_updates_channel",
+)
+
+
+class ConfigError(Exception):
+    """Raised with a report of every setting or channel that is missing or wrong."""
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Every setting of the bot, read once at startup.
+
+    Each field is read from the environment variable of the same name in
+    upper case. Fields without a default are required.
+    """
+
+    token: str
+    database_url: str
+    owner_ids: frozenset
+
+    bot_error_log: int
+    mod_channel: int
+    add_challenges_channel: int
+    challenge_solves_channel: int
+    challenges_channel: int
+    new_members_channel: int
+    existing_members_channel: int
+    bot_updates_channel: int
+
+    db_pool_min_size: int = 2
+    db_pool_max_size: int = 10
+    db_acquire_timeout: float = 10.0
+    db_statement_cache_size: int = 100
+    submission_log_batch: int = 500
+    submission_log_interval: float = 2.0
+    submission_log_queue: int = 10000
+    scoreboard_refresh_interval: float = 10.0
+    flag_hash_workers: int = 2
+    rate_limit_backend: str = "postgres"
+    flag_limit_user_burst: int = 5
+    flag_limit_user_per: float = 30.0
+    flag_limit_challenge_burst: int = 2
+    flag_limit_challenge_per: float = 60.0
+    solve_announce_window: float = 2.0
+    shutdown_timeout: float = 20.0  # seconds for running commands and flushes
+    error_report_window: float = 60.0  # seconds between posts of a repeated error
+    execute_timeout: float = 10.0  # seconds, for -execute queries
+    execute_max_rows: int = 10000
+    execute_max_bytes: int = 4 * 1024 * 1024  # under Discord's attachment limit
+    port: int = 1337  # worker N serves on port + N
+
+    # set by launch.py when the bot runs as several processes
+    worker_id: int = 0  # worker 0 sends every announcement
+    workers: int = 1
+    shard_count: int = 0  # 0 asks Discord how many shards to use
+    shard_ids: str = ""  # comma separated, empty for every shard
+
+    @property
+    def shards(self):
+        """SHARD_IDS as a list, or None for every shard."""
+        return [int(i) for i in self.shard_ids.split(",")] if self.shard_ids else None
+
+    @classmethod
+    def load(cls, secrets_path, environ=os.environ):
+        """Read the settings, reporting every problem at once."""
+        with open(secrets_path) as secrets_file:
+            secrets = json.load(secrets_file)
+
+        values = {"owner_ids": frozenset(secrets["OWNER_IDS"])}
+        problems = []
+        for field in fields(cls):
+            if field.name in values:
+                continue
+            name = field.name.upper()
+            raw = environ.get(name)
+            if not raw:
+                if field.default is MISSING:
+                    problems.append(f"{name} is not set")
+                continue
+            try:
+                values[field.name] = field.type(raw)
+            except ValueError:
+                problems.append(f"{name}={raw!r} is not a valid {field.type.__name__}")
+
+        shard_ids = values.get("shard_ids", "")
+        if shard_ids and not all(i.strip().isdigit() for i in shard_ids.split(",")):
+            problems.append(f"SHARD_IDS={shard_ids!r} is not a list of shard ids")
+        elif shard_ids and not values.get("shard_count"):
+            problems.append("SHARD_IDS needs SHARD_COUNT")
+
+        if problems:
+            raise ConfigError("invalid configuration:\n" + "\n".join(problems))
+        return cls(**values)
+
+
+class Channels:
+    """
+    The bot's channels, resolved once after the gateway is ready.
+
+    Attributes are named like the Settings fields, e.g. `challenges_channel`.
+    Commands that use them `await wait()` first.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self._resolved = asyncio.Event()
+
+    @property
+    def ready(self):
+        return self._resolved.is_set()
+
+    @ready.setter
+    def ready(self, value):
+        if value:
+            self._resolved.set()
+        else:
+            self._resolved.clear()
+
+    async def wait(self):
+        await self._resolved.wait()
+
+    async def resolve(self, bot):
+        """Look up every channel, falling back to the API once if it is not cached."""
+        problems = []
+        for name in CHANNEL_FIELDS:
+            channel_id = getattr(self.settings, name)
+            channel = bot.get_channel(channel_id)
+            if channel is None:
+                try:
+                    channel = await bot.fetch_channel(channel_id)
+                except nextcord.NotFound:
+                    problems.append(f"{name.upper()}={channel_id}: no such channel")
+                except nextcord.Forbidden:
+                    problems.append(f"{name.upper()}={channel_id}: no access")
+                except nextcord.HTTPException as error:
+                    problems.append(f"{name.upper()}={channel_id}: {error}")
+            setattr(self, name, channel)
+
+        if problems:
+            raise ConfigError("unusable channels:\n" + "\n".join(problems))
+        self.ready = True
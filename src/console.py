@@ -0,0 +1,100 @@
+#!/bin/env python3
+"""
+Bounded query runner behind the owner's -execute command.
+
+Rows are streamed from a cursor into a TSV file as they arrive, in memory
+up to SPOOL_SIZE and on disk after that, until the row or byte cap is hit.
+However big the table, the bot holds one prefetch batch of rows at a time
+and the query is cancelled by Postgres after `timeout` seconds.
+"""
+import tempfile, time
+
+PREFETCH = 500  # rows per round trip
+SPOOL_SIZE = 256 * 1024  # bytes kept in memory before the file goes to disk
+
+
+class QueryResult:
+    def __init__(self):
+        self.status = None  # e.g. "UPDATE 3"
+        self.columns = []
+        self.rows = 0
+        self.truncated = None  # why not every row was written
+        self.output = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        self.elapsed = 0.0
+
+    @property
+    def size(self):
+        return self.output.tell()
+
+    def text(self):
+        self.output.seek(0)
+        return self.output.read().decode("utf-8", "replace")
+
+    def close(self):
+        self.output.close()
+
+
+def tsv_field(value):
+    if value is None:
+        return "NULL"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def tsv_line(values):
+    return ("\t".join(tsv_field(value) for value in values) + "\n").encode()
+
+
+def pages(text, size, max_pages):
+    """
+    Split text into at most `max_pages` pages of at most `size` characters,
+    at line ends. Returns None when it does not fit, or when a single line is
+    longer than a page, so nothing is ever cut.
+    """
+    found = []
+    page = ""
+    for line in text.splitlines(keepends=True):
+        if len(line) > size:
+            return None
+        if page and len(page) + len(line) > size:
+            found.append(page)
+            page = ""
+        page += line
+    if page:
+        found.append(page)
+    return found if len(found) <= max_pages else None
+
+
+async def run_query(conn, query, *, timeout, max_rows, max_bytes):
+    """Run one statement and return a QueryResult. Raises asyncpg errors."""
+    result = QueryResult()
+    start = time.perf_counter()
+    # for the session, reset before the connection goes back to the pool
+    await conn.execute(
+        "SELECT set_config('statement_timeout', $1, false)",
+        str(int(timeout * 1000)),
+    )
+    try:
+        statement = await conn.prepare(query)
+        result.columns = [attribute.name for attribute in statement.get_attributes()]
+        if not result.columns:
+            # INSERT, UPDATE, ... without RETURNING, and VACUUM or CREATE
+            # INDEX CONCURRENTLY, which refuse to run in a transaction
+            await statement.fetch()
+            result.status = statement.get_statusmsg()
+        else:
+            result.output.write(tsv_line(result.columns))
+            async with conn.transaction():  # cursors only live in one
+                async for record in statement.cursor(prefetch=PREFETCH):
+                    if result.rows >= max_rows:
+                        result.truncated = f"stopped at {max_rows} rows"
+                        break
+                    line = tsv_line(record)
+                    if result.size + len(line) > max_bytes:
+                        result.truncated = f"stopped at {max_bytes} bytes"
+                        break
+                    result.output.write(line)
+                    result.rows += 1
+    finally:
+        await conn.execute("RESET statement_timeout")
+    result.elapsed = time.perf_counter() - start
+    return result
@@ -0,0 +1,204 @@
+#!/bin/env python3
+import asyncio, logging, time
+from contextlib import asynccontextmanager
+
+import asyncpg
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+MAX_PAYLOAD = 7000  # bytes, Postgres refuses NOTIFY payloads from 8000
+
+
+class Database:
+    """
+    Bot-wide asyncpg connection pool.
+
+    The pool is created once at startup and shared by every command, so a
+    handler only pays for an acquire instead of a full connect/auth handshake.
+    Connections are always handed back to the pool, even when a handler raises.
+    """
+
+    def __init__(
+        self,
+        dsn,
+        *,
+        min_size=2,
+        max_size=10,
+        acquire_timeout=10.0,
+        statement_cache_size=100,
+    ):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.statement_cache_size = statement_cache_size
+        self.pool = None
+        self._lock = asyncio.Lock()
+        self._listener = None  # dedicated LISTEN connection, outside the pool
+        self._listen_lock = asyncio.Lock()
+        self._channels = {}  # NOTIFY channel -> (callback, on_reconnect)
+
+        # acquire statistics, used to size the pool
+        self.acquires = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def connect(self):
+        """Create the pool. Safe to call more than once."""
+        async with self._lock:
+            if self.pool is None:
+                self.pool = await asyncpg.create_pool(
+                    self.dsn,
+                    min_size=self.min_size,
+                    max_size=self.max_size,
+                    statement_cache_size=self.statement_cache_size,
+                    init=self._init_connection,
+                )
+                log.info(
+                    "database pool ready (min=%d, max=%d)",
+                    self.min_size,
+                    self.max_size,
+                )
+        return self.pool
+
+    async def _init_connection(self, conn):
+        conn.add_query_logger(metrics.observe_query)  # query timings by statement
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Borrow a connection from the pool and always give it back."""
+        start = time.perf_counter()
+        try:
+            conn = await self.pool.acquire(timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        waited = time.perf_counter() - start
+        self.acquires += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        metrics.pool_wait_seconds.observe(waited)
+
+        try:
+            yield conn
+        finally:
+            await self.pool.release(conn)
+
+    async def notify(self, channel, payload=""):
+        """Send a NOTIFY to every replica, including this one."""
+        async with self.acquire() as conn:
+            await conn.execute("SELECT pg_notify($1, $2)", channel, payload)
+
+    @staticmethod
+    async def notify_ids(conn, channel, ids):
+        """
+        Send comma separated ids on `channel` from `conn`, so they go out when
+        its transaction commits. Too many for one payload are sent as an empty
+        one, which tells every `listen_ids` to reload.
+        """
+        payload = ",".join(str(id) for id in ids)
+        if len(payload) > MAX_PAYLOAD:
+            payload = ""
+        await conn.execute("SELECT pg_notify($1, $2)", channel, payload)
+
+    async def listen_ids(self, channel, on_ids, reload):
+        """
+        Call `on_ids(ids)` for every `notify_ids` on `channel`, and start
+        `reload()` for an empty payload or after the connection was reopened.
+        """
+
+        def callback(payload):
+            if not payload:
+                asyncio.create_task(reload())
+            else:
+                on_ids([int(id) for id in payload.split(",")])
+
+        await self.listen(channel, callback, on_reconnect=reload)
+
+    async def listen(self, channel, callback, on_reconnect=None):
+        """
+        Call `callback(payload)` for every NOTIFY on `channel`.
+
+        Every channel shares one connection. If it drops it is reopened, but
+        notifications sent in between are lost, so `on_reconnect()` should
+        reload whatever they would have updated.
+        """
+        async with self._listen_lock:
+            self._channels[channel] = (callback, on_reconnect)
+            if self._listener is None:
+                await self._connect_listener()
+            else:
+                await self._listener.add_listener(channel, self._on_notify)
+
+    async def _connect_listener(self):
+        listener = await asyncpg.connect(self.dsn)
+        for channel in self._channels:
+            await listener.add_listener(channel, self._on_notify)
+        listener.add_termination_listener(self._on_terminate)
+        self._listener = listener
+
+    def _on_notify(self, conn, pid, channel, payload):
+        callback, _ = self._channels[channel]
+        callback(payload)
+
+    def _on_terminate(self, conn):
+        log.warning("LISTEN connection lost, reconnecting")
+        self._listener = None
+        asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = 1
+        while True:
+            try:
+                async with self._listen_lock:
+                    await self._connect_listener()
+                break
+            except (OSError, asyncpg.PostgresError):
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+
+        for _, on_reconnect in self._channels.values():
+            if on_reconnect is not None:
+                await on_reconnect()
+
+    def stats(self):
+        """Current pool usage and acquire wait times (in milliseconds)."""
+        size = self.pool.get_size() if self.pool else 0
+        idle = self.pool.get_idle_size() if self.pool else 0
+        return {
+            "size": size,
+            "in_use": size - idle,
+            "idle": idle,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "acquires": self.acquires,
+            "timeouts": self.timeouts,
+            "wait_avg_ms": (
+                round(1000 * self.wait_total / self.acquires, 2)
+                if self.acquires
+                else 0.0
+            ),
+            "wait_max_ms": round(1000 * self.wait_max, 2),
+        }
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.remove_termination_listener(self._on_terminate)
+            await self._listener.close()
+            self._listener = None
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    def terminate(self):
+        """Close every connection at once, even those still in use."""
+        if self._listener is not None:
+            self._listener.remove_termination_listener(self._on_terminate)
+            self._listener.terminate()
+            self._listener = None
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
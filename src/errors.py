@@ -0,0 +1,158 @@
+#!/bin/env python3
+import asyncio, hashlib, io, logging, os, time, traceback
+from collections import OrderedDict, deque
+
+import nextcord
+
+from constants import colors
+
+log = logging.getLogger(__name__)
+
+
+def fingerprint(error):
+    """Same type raised through the same functions, whatever the message or line."""
+    frames = traceback.extract_tb(error.__traceback__)
+    key = type(error).__qualname__ + "".join(
+        f"|{os.path.basename(frame.filename)}:{frame.name}" for frame in frames
+    )
+    return hashlib.sha1(key.encode()).hexdigest()[:10]
+
+
+class _ErrorGroup:
+    __slots__ = (
+        "fingerprint",
+        "kind",
+        "message",
+        "traceback",
+        "context",
+        "count",
+        "first_seen",
+        "last_seen",
+        "unreported",
+        "reported_on",
+    )
+
+    def __init__(self, key, error, context, now):
+        self.fingerprint = key
+        self.kind = type(error).__name__
+        self.message = str(error)
+        self.traceback = "".join(
+            traceback.format_exception(type(error), error, error.__traceback__)
+        )
+        self.context = context
+        self.count = 1
+        self.first_seen = self.last_seen = now
+        self.unreported = 0  # repeats since the last post
+        self.reported_on = None
+
+
+class ErrorReporter:
+    """
+    Command errors, grouped by fingerprint before they reach BOT_ERROR_LOG.
+
+    The first error of a group is posted right away with its traceback
+    attached. Repeats are only counted, and each group gets at most one
+    summary per `window` seconds, so a database outage costs a few messages
+    instead of one per command. The latest errors stay in a ring buffer
+    for -errors. Each worker reports its own errors.
+    """
+
+    MAX_GROUPS = 500  # least recently seen groups are forgotten beyond this
+    TICK = 5  # seconds between checks for due summaries
+
+    def __init__(self, get_channel, *, window=60.0, recent=100):
+        self.get_channel = get_channel  # the channel, None until it is known
+        self.window = window
+        self.groups = OrderedDict()  # fingerprint -> _ErrorGroup, oldest first
+        self.recent = deque(maxlen=recent)  # (time, fingerprint, context)
+        self._wake = asyncio.Event()
+        self._task = None
+
+        self.posted = 0
+        self.failed = 0
+
+    def report(self, error, context):
+        """Record an error, `context` says who ran into it where."""
+        error = getattr(error, "original", error)  # unwrap CommandInvokeError
+        key = fingerprint(error)
+        now = time.time()
+        group = self.groups.get(key)
+        if group is None:
+            log.error("%s", context, exc_info=error)
+            group = self.groups[key] = _ErrorGroup(key, error, context, now)
+            if len(self.groups) > self.MAX_GROUPS:
+                self.groups.popitem(last=False)
+            self._wake.set()
+        else:
+            self.groups.move_to_end(key)
+            group.message = str(error)
+            group.context = context
+            group.count += 1
+            group.last_seen = now
+            group.unreported += 1
+        self.recent.append((now, key, context))
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return key
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.TICK)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            channel = self.get_channel()
+            if channel is None:
+                continue
+            now = time.time()
+            for group in list(self.groups.values()):
+                if group.reported_on is None:
+                    repeats = None
+                elif group.unreported and now - group.reported_on >= self.window:
+                    repeats = group.unreported
+                else:
+                    continue
+                group.reported_on = now
+                group.unreported = 0
+                try:
+                    await self._post(channel, group, repeats)
+                    self.posted += 1
+                except Exception:  # HTTP errors as well as a lost connection
+                    log.exception("posting error %s failed", group.fingerprint)
+                    self.failed += 1
+
+    async def _post(self, channel, group, repeats):
+        if repeats is None:
+            embed = nextcord.Embed(
+                title="Exception raised", description=group.context, color=colors["RED"]
+            )
+        else:
+            embed = nextcord.Embed(
+                title="Exception repeated",
+                description=f"{repeats} more times since it was last posted, last: {group.context}",
+                color=colors["ORANGE"],
+            )
+        embed.add_field(name="Error:", value=group.kind)
+        embed.add_field(name="Fingerprint:", value=f"`{group.fingerprint}`")
+        embed.add_field(name="Seen:", value=f"{group.count} times")
+        embed.add_field(name="Detail:", value=group.message[:1024] or "-", inline=False)
+        file = nextcord.File(
+            io.BytesIO(group.traceback.encode()), f"traceback-{group.fingerprint}.txt"
+        )
+        await channel.send(embed=embed, file=file)
+
+    def stats(self):
+        return {
+            "groups": len(self.groups),
+            "recent": len(self.recent),
+            "posted": self.posted,
+            "post_failed": self.failed,
+        }
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,241 @@
+#!/bin/env python3
+"""
+Import and export a whole event: members, challenges, hashed flags, solves,
+submissions, hints and scheduled jobs.
+
+    python src/event.py export event.jsonl.gz
+    python src/event.py import event.jsonl.gz [--replace]
+
+The file is gzipped JSON lines: a header, then for each table a line naming
+the table and its columns followed by one JSON array per row. Exports stream
+rows through a server-side cursor and imports load them with binary COPY in
+fixed-size chunks, so memory use does not grow with the size of the event.
+Solve counts, solve values and scores are not exported, they are rebuilt
+after an import. Running bots reload their members, challenges, flags and
+jobs when an import commits; hints waiting for their release time are only
+scheduled when a bot starts, so restart the bots after importing those.
+"""
+import argparse, asyncio, gzip, json, os, sys, time
+from datetime import datetime
+from pathlib import Path
+
+import asyncpg
+
+from migrate import migrate
+
+FORMAT = "ctf-bot-event"
+VERSION = 3  # 2 added scoring and hints, 3 publishing; older files still import
+CHUNK_SIZE = 10000  # rows per COPY
+
+# in foreign key order, so an import never references a missing row
+TABLES = {
+    "members": ("serial_num", "member_id", "server_nickname", "added_on", "message_id"),
+    "challenges": (
+        "challenge_id",
+        "author_id",
+        "added_on",
+        "category",
+        "challenge_description",
+        "messsage_id",
+        "points",
+        "min_points",
+        "decay",
+        "published_on",
+    ),
+    "flags": ("challenge_id", "added_on", "flag", "message_id"),
+    "solvers": ("challenge_id", "member_id", "solved_on", "message_id_on_success"),
+    "submissions": (
+        "serial_num",
+        "challenge_id",
+        "member_id",
+        "submitted_flags",
+        "added_on",
+        "message_id",
+    ),
+    "hints": (
+        "hint_id",
+        "challenge_id",
+        "body",
+        "cost",
+        "release_on",
+        "released_on",
+        "added_on",
+        "message_id",
+    ),
+    "hint_unlocks": ("hint_id", "member_id", "cost", "unlocked_on"),
+    "jobs": ("job_id", "kind", "payload", "due_on"),
+}
+TIMESTAMP_COLUMNS = {
+    "added_on",
+    "solved_on",
+    "release_on",
+    "released_on",
+    "unlocked_on",
+    "published_on",
+    "due_on",
+}
+SERIAL_COLUMNS = {
+    "members": "serial_num",
+    "challenges": "challenge_id",
+    "submissions": "serial_num",
+    "hints": "hint_id",
+    "jobs": "job_id",
+}
+
+
+def _encode(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _decoder(columns):
+    timestamps = [i for i, column in enumerate(columns) if column in TIMESTAMP_COLUMNS]
+
+    def decode(row):
+        for i in timestamps:
+            if row[i] is not None:
+                row[i] = datetime.fromisoformat(row[i])
+        return tuple(row)
+
+    return decode
+
+
+async def export_event(conn, path):
+    """Write every table to `path`. Returns {table: rows written}."""
+    counts = {}
+    with gzip.open(path, "wt", encoding="utf-8") as out:
+        out.write(json.dumps({"format": FORMAT, "version": VERSION}) + "\n")
+
+        # one snapshot for all tables, so solves never point at missing flags
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            for table, columns in TABLES.items():
+                out.write(json.dumps({"table": table, "columns": columns}) + "\n")
+                query = f"SELECT {', '.join(columns)} FROM {table} ORDER BY 1"
+                counts[table] = 0
+                async for record in conn.cursor(query, prefetch=CHUNK_SIZE):
+                    out.write(json.dumps([_encode(value) for value in record]) + "\n")
+                    counts[table] += 1
+    return counts
+
+
+def read_event(path):
+    """Yield (table, columns, rows) for every table in an event file."""
+    with gzip.open(path, "rt", encoding="utf-8") as src:
+        header = json.loads(src.readline())
+        if header.get("format") != FORMAT or header.get("version") not in (
+            1,
+            2,
+            VERSION,
+        ):
+            raise ValueError(f"{path} is not a version 1 to {VERSION} event file")
+
+        table = columns = None
+        rows = []
+        for line in src:
+            item = json.loads(line)
+            if isinstance(item, dict):
+                if table is not None:
+                    yield table, columns, rows
+                table, columns = item["table"], tuple(item["columns"])
+                if table not in TABLES:
+                    raise ValueError(f"unknown table {table!r} in {path}")
+                decode = _decoder(columns)
+                rows = []
+            else:
+                rows.append(decode(item))
+                if len(rows) >= CHUNK_SIZE:
+                    yield table, columns, rows
+                    rows = []
+        if table is not None:
+            yield table, columns, rows
+
+
+async def notify_bots(conn):
+    """Make running bots reload what an import changed (sent on commit)."""
+    # imported here, like migrate.hot_queries, the web server is not needed
+    from challengeindex import INDEX_CHANNEL
+    from flagcache import FLAGS_CHANNEL
+    from jobs import JOBS_CHANNEL
+    from members import MEMBERS_CHANNEL
+    from server import CHALLENGES_CHANNEL
+
+    # an empty payload reloads everything
+    for channel in (
+        INDEX_CHANNEL,
+        MEMBERS_CHANNEL,
+        FLAGS_CHANNEL,
+        JOBS_CHANNEL,
+        CHALLENGES_CHANNEL,
+    ):
+        await conn.execute("SELECT pg_notify($1, '')", channel)
+
+
+async def import_event(conn, path, replace=False):
+    """Load an event file in one transaction. Returns {table: rows loaded}."""
+    counts = dict.fromkeys(TABLES, 0)
+    async with conn.transaction():
+        if replace:
+            await conn.execute(f"TRUNCATE {', '.join(TABLES)} CASCADE")
+
+        published = True
+        for table, columns, rows in read_event(path):
+            if table == "challenges" and "published_on" not in columns:
+                published = False
+            if rows:
+                await conn.copy_records_to_table(table, records=rows, columns=columns)
+                counts[table] += len(rows)
+
+        # imported rows carry their own ids, so move the sequences past them
+        for table, column in SERIAL_COLUMNS.items():
+            await conn.execute(
+                f"""
+                SELECT setval(
+                    pg_get_serial_sequence('{table}', '{column}'),
+                    COALESCE(MAX({column}), 0) + 1,
+                    false
+                ) FROM {table}
+                """
+            )
+        if not published:  # files from before publishing was recorded
+            await conn.execute(
+                "UPDATE challenges SET published_on = added_on WHERE published_on IS NULL"
+            )
+        await conn.execute("SELECT rebuild_scores()")  # see migration 0007
+        await notify_bots(conn)
+
+    await conn.execute("REFRESH MATERIALIZED VIEW first_bloods")
+    await conn.execute("REFRESH MATERIALIZED VIEW scoreboard")
+    return counts
+
+
+async def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("path")
+    parser.add_argument(
+        "--replace", action="store_true", help="empty the tables before importing"
+    )
+    parser.add_argument("--database", help="defaults to DATABASE_URL")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parents[1] / ".env")
+    conn = await asyncpg.connect(args.database or os.getenv("DATABASE_URL"))
+    try:
+        start = time.perf_counter()
+        if args.command == "export":
+            counts = await export_event(conn, args.path)
+        else:
+            await migrate(conn)
+            counts = await import_event(conn, args.path, replace=args.replace)
+        elapsed = time.perf_counter() - start
+    finally:
+        await conn.close()
+
+    for table, count in counts.items():
+        print(f"{table:<12} {count:>10} rows")
+    print(f"{args.command}ed {sum(counts.values())} rows in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
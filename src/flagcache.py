@@ -0,0 +1,58 @@
+#!/bin/env python3
+import asyncio, logging
+
+log = logging.getLogger(__name__)
+
+# NOTIFY channel used by every bot replica whenever a row in `flags` changes
+FLAGS_CHANNEL = "flags_changed"
+
+FLAG_QUERY = "SELECT flag FROM flags WHERE challenge_id = $1"
+
+
+class FlagCache:
+    """
+    Process-local copy of the `flags` table: challenge_id -> hashed flag.
+
+    It is filled once at startup and kept in sync through LISTEN/NOTIFY, so
+    `-flag` can check a submission without reading the database. Whoever
+    writes to `flags` must call `notify()` inside the same transaction.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.flags = {}
+
+    def get(self, challenge_id):
+        return self.flags.get(challenge_id)
+
+    def set(self, challenge_id, hashed_flag):
+        self.flags[challenge_id] = hashed_flag
+
+    async def load(self):
+        """(Re)load every flag from the database."""
+        async with self.db.acquire() as conn:
+            rows = await conn.fetch("SELECT challenge_id, flag FROM flags")
+        self.flags = {row["challenge_id"]: row["flag"] for row in rows}
+        log.info("flag cache loaded %d flags", len(self.flags))
+
+    async def refresh(self, challenge_id):
+        """Re-read a single challenge's flag after another replica changed it."""
+        async with self.db.acquire() as conn:
+            flag = await conn.fetchval(FLAG_QUERY, challenge_id)
+        if flag is None:
+            self.flags.pop(challenge_id, None)
+        else:
+            self.flags[challenge_id] = flag
+
+    async def notify(self, conn, challenge_id):
+        """Tell every replica that this challenge's flag changed (sent on commit)."""
+        await self.db.notify_ids(conn, FLAGS_CHANNEL, [challenge_id])
+
+    async def listen(self):
+        """Follow flag changes made by every replica."""
+        # notifications missed while disconnected are lost, so reload everything
+        await self.db.listen_ids(FLAGS_CHANNEL, self._on_notify, self.load)
+
+    def _on_notify(self, challenge_ids):
+        for challenge_id in challenge_ids:
+            asyncio.create_task(self.refresh(challenge_id))
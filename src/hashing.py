@@ -0,0 +1,86 @@
+#!/bin/env python3
+import asyncio, base64, hashlib, hmac, os
+from concurrent.futures import ThreadPoolExecutor
+
+# Stored flag formats:
+#   <64 hex chars>                        legacy md5+sha256, no salt
+#   $scrypt$n=16384,r=8,p=1$<salt>$<hash> scrypt with a per-challenge salt
+SCRYPT_PREFIX = "$scrypt$"
+
+
+def legacy_hash(flag):
+    md = hashlib.md5(flag.encode("ascii"))
+    salted = md.hexdigest() + flag
+    hashed = hashlib.sha256(salted.encode("ascii"))
+    return hashed.hexdigest().split("\n")[0]
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def scrypt_hash(flag, salt, n, r, p):
+    digest = hashlib.scrypt(
+        flag.encode("utf-8"), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + 2**20
+    )
+    return f"{SCRYPT_PREFIX}n={n},r={r},p={p}${_b64(salt)}${_b64(digest)}"
+
+
+def parse_scrypt(stored):
+    """Split an encoded scrypt hash into (salt, n, r, p)."""
+    params, salt, _ = stored[len(SCRYPT_PREFIX) :].split("$")
+    params = dict(item.split("=") for item in params.split(","))
+    return _unb64(salt), int(params["n"]), int(params["r"]), int(params["p"])
+
+
+class FlagHasher:
+    """
+    Hashes and verifies flags without blocking the event loop.
+
+    scrypt is deliberately slow and memory-hard, so every hash runs in a
+    bounded thread pool (hashlib releases the GIL while it works). At most
+    `max_pending` hashes wait for a worker; further callers wait their turn.
+    """
+
+    def __init__(self, *, workers=2, max_pending=64, n=2**14, r=8, p=1):
+        self.n = n
+        self.r = r
+        self.p = p
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="flag-hash"
+        )
+        self._pending = asyncio.Semaphore(max_pending)
+
+    async def _run(self, func, *args):
+        async with self._pending:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+
+    async def hash(self, flag):
+        """Hash a new flag with the current scheme and a fresh salt."""
+        return await self._run(
+            scrypt_hash, flag, os.urandom(16), self.n, self.r, self.p
+        )
+
+    async def digest(self, flag, stored):
+        """Hash `flag` the same way `stored` was hashed, for comparing or querying."""
+        if stored.startswith(SCRYPT_PREFIX):
+            return await self._run(scrypt_hash, flag, *parse_scrypt(stored))
+        return legacy_hash(flag)
+
+    async def verify(self, flag, stored):
+        return hmac.compare_digest(await self.digest(flag, stored), stored)
+
+    def needs_rehash(self, stored):
+        """True for legacy hashes and scrypt hashes made with other parameters."""
+        if not stored.startswith(SCRYPT_PREFIX):
+            return True
+        _, n, r, p = parse_scrypt(stored)
+        return (n, r, p) != (self.n, self.r, self.p)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
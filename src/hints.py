@@ -0,0 +1,147 @@
+#!/bin/env python3
+import logging
+from datetime import datetime
+
+from scheduler import parse_time
+
+log = logging.getLogger(__name__)
+
+# hints of a challenge that is not published yet are not shown
+HINTS_QUERY = """
+    SELECT h.hint_id, h.body, h.cost, h.release_on, h.released_on
+        FROM hints AS h
+        JOIN challenges AS c ON c.challenge_id = h.challenge_id
+            WHERE h.challenge_id = $1 AND c.published_on IS NOT NULL
+                ORDER BY h.hint_id
+    """
+
+
+def parse_unlock(text, now, tz):
+    """
+    Parse how a hint unlocks: a point cost ("50"), a delay after `now`
+    ("+30m", "+2h", "+1d") or a time ("2026-10-18T20:00"), see parse_time.
+
+    Returns (cost, release_on), raises ValueError.
+    """
+    if text.isdigit():
+        return int(text), None
+    return 0, parse_time(text, now, tz)
+
+
+class Hints:
+    """
+    Challenge hints, released at a set time or unlocked for points.
+
+    Hints waiting for their time are put on the bot's Scheduler at startup
+    and when added. Releasing one is a conditional UPDATE, so when several
+    replicas schedule the same hint only one of them calls `on_release`.
+    A hint whose time comes before its challenge is published waits for
+    the publish, see `release_due`. Unlocking goes through unlock_hint()
+    (migrations 0007 and 0010).
+    """
+
+    def __init__(self, db, scheduler, tz, on_release):
+        self.db = db
+        self.scheduler = scheduler
+        self.tz = tz  # of the naive timestamps in the database
+        self.on_release = on_release  # (hint_id, challenge_id, body)
+
+    def _schedule(self, hint_id, release_on):
+        when = self.tz.localize(release_on).timestamp()
+        self.scheduler.call_at(when, self.release, hint_id)
+
+    async def load(self):
+        """Schedule every hint that is still waiting for its time."""
+        async with self.db.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT hint_id, release_on
+                    FROM hints
+                        WHERE release_on IS NOT NULL AND released_on IS NULL
+                """
+            )
+        for row in rows:
+            self._schedule(row["hint_id"], row["release_on"])
+        log.info("scheduled %d hints", len(rows))
+
+    async def add(self, challenge_id, body, *, cost, release_on, added_on, message_id):
+        """Add a hint. Free hints without a release time are out right away."""
+        async with self.db.acquire() as conn:
+            hint_id = await conn.fetchval(
+                """
+                INSERT INTO hints (
+                    challenge_id,
+                    body,
+                    cost,
+                    release_on,
+                    released_on,
+                    added_on,
+                    message_id
+                )
+                VALUES ($1, $2, $3, $4, $5, $6, $7)
+                RETURNING hint_id
+                """,
+                challenge_id,
+                body,
+                cost,
+                release_on,
+                added_on if cost == 0 and release_on is None else None,
+                added_on,
+                message_id,
+            )
+        if release_on is not None:
+            self._schedule(hint_id, release_on)
+        return hint_id
+
+    async def release(self, hint_id):
+        async with self.db.acquire() as conn:
+            row = await conn.fetchrow(
+                """
+                UPDATE hints AS h
+                    SET released_on = $2
+                        FROM challenges AS c
+                            WHERE h.hint_id = $1
+                                AND h.released_on IS NULL
+                                AND c.challenge_id = h.challenge_id
+                                AND c.published_on IS NOT NULL
+                RETURNING h.challenge_id, h.body
+                """,
+                hint_id,
+                datetime.now(self.tz).replace(microsecond=0, tzinfo=None),
+            )
+        # None when another replica released it already, or the challenge
+        # is not published yet
+        if row is not None:
+            self.on_release(hint_id, row["challenge_id"], row["body"])
+
+    async def release_due(self, challenge_ids):
+        """Release the hints whose time came before their challenge was published."""
+        async with self.db.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                UPDATE hints
+                    SET released_on = $2
+                        WHERE challenge_id = ANY($1::INT[])
+                            AND released_on IS NULL
+                            AND release_on <= $2
+                RETURNING hint_id, challenge_id, body
+                """,
+                challenge_ids,
+                datetime.now(self.tz).replace(microsecond=0, tzinfo=None),
+            )
+        for row in sorted(rows, key=lambda row: row["hint_id"]):
+            self.on_release(row["hint_id"], row["challenge_id"], row["body"])
+
+    async def unlock(self, hint_id, member_id, unlocked_on):
+        """Returns (status, challenge_id, body, cost), see unlock_hint()."""
+        async with self.db.acquire() as conn:
+            return await conn.fetchrow(
+                "SELECT * FROM unlock_hint($1, $2, $3)",
+                hint_id,
+                member_id,
+                unlocked_on,
+            )
+
+    async def for_challenge(self, challenge_id):
+        async with self.db.acquire() as conn:
+            return await conn.fetch(HINTS_QUERY, challenge_id)
@@ -0,0 +1,118 @@
+#!/bin/env python3
+import asyncio, json, logging
+from collections import defaultdict
+from datetime import datetime, timezone
+
+log = logging.getLogger(__name__)
+
+# NOTIFY channel, the payload is the due time of a new job as a Unix timestamp,
+# or empty to reload every job
+JOBS_CHANNEL = "jobs_added"
+
+# claims and deletes up to $2 jobs due at $1, skipping those other workers hold
+CLAIM_JOBS = """
+    DELETE FROM jobs
+        WHERE job_id IN (
+            SELECT job_id
+                FROM jobs
+                    WHERE due_on <= $1
+                        ORDER BY due_on
+                            LIMIT $2
+                                FOR UPDATE SKIP LOCKED
+        )
+    RETURNING job_id, kind, payload
+    """
+
+
+class Jobs:
+    """
+    Jobs that run at a set time, kept in the `jobs` table (migration 0008).
+
+    Every worker puts the due times on its Scheduler: all of them at startup,
+    including those missed while no bot was running, and new ones as they are
+    added by any worker through NOTIFY. When a time comes the worker claims
+    every due job with SKIP LOCKED and deletes it in the same statement, so
+    each job runs at most once. The due jobs of a kind are passed to their
+    handler together, so 50 challenges released at once are one call.
+    """
+
+    MAX_BATCH = 500  # jobs claimed per statement
+
+    def __init__(self, db, scheduler):
+        self.db = db
+        self.scheduler = scheduler
+        self.handlers = {}  # kind -> async handler(payloads)
+        self._scheduled = set()  # due times already on the scheduler
+
+    def register(self, kind, handler):
+        self.handlers[kind] = handler
+
+    def _schedule(self, when):
+        if when not in self._scheduled:
+            self._scheduled.add(when)
+            self.scheduler.call_at(when, self.run_due, when)
+
+    async def start(self):
+        """Schedule the waiting jobs and those added by other workers from now on."""
+        await self.db.listen(
+            JOBS_CHANNEL,
+            self._on_notify,
+            on_reconnect=self.load,  # jobs added while not listening
+        )
+        await self.load()
+
+    def _on_notify(self, payload):
+        if not payload:
+            asyncio.create_task(self.load())
+        else:
+            self._schedule(float(payload))
+
+    async def load(self):
+        async with self.db.acquire() as conn:
+            rows = await conn.fetch("SELECT DISTINCT due_on FROM jobs")
+        for row in rows:
+            self._schedule(row["due_on"].timestamp())
+        log.info("scheduled jobs at %d times", len(rows))
+
+    async def add(self, kind, payload, due_on):
+        """Run `kind`'s handler with `payload` at `due_on`, an aware datetime."""
+        when = due_on.timestamp()
+        async with self.db.acquire() as conn:
+            async with conn.transaction():
+                job_id = await conn.fetchval(
+                    """
+                    INSERT INTO jobs (kind, payload, due_on)
+                        VALUES ($1, $2, $3)
+                    RETURNING job_id
+                    """,
+                    kind,
+                    json.dumps(payload),
+                    due_on,
+                )
+                await conn.execute("SELECT pg_notify($1, $2)", JOBS_CHANNEL, repr(when))
+        self._schedule(when)
+        return job_id
+
+    async def run_due(self, when=None):
+        self._scheduled.discard(when)
+        # our own clock decides what is due, the one the scheduler woke us by
+        now = datetime.now(timezone.utc)
+        while True:
+            async with self.db.acquire() as conn:
+                rows = await conn.fetch(CLAIM_JOBS, now, self.MAX_BATCH)
+
+            payloads = defaultdict(list)
+            for row in sorted(rows, key=lambda row: row["job_id"]):
+                payloads[row["kind"]].append(json.loads(row["payload"]))
+            for kind, batch in payloads.items():
+                handler = self.handlers.get(kind)
+                if handler is None:
+                    log.error("dropped %d jobs of unknown kind %r", len(batch), kind)
+                    continue
+                try:
+                    await handler(batch)
+                except Exception:
+                    log.exception("%d %r jobs failed", len(batch), kind)
+
+            if len(rows) < self.MAX_BATCH:
+                return
@@ -0,0 +1,133 @@
+#!/bin/env python3
+"""
+Run the bot as several worker processes, each with its own range of shards.
+
+    python src/launch.py --workers 4 [--shards 16]
+
+Without --shards the shard count recommended by Discord is used. Every
+worker serves the web pages on PORT + its worker id; worker 0 also sends all
+announcements. Crashed workers are restarted, Ctrl+C or SIGTERM stops them all.
+"""
+import argparse, os, signal, subprocess, sys, time
+from pathlib import Path
+
+import requests
+from dotenv import load_dotenv
+
+from config import ConfigError, Settings
+
+cwd = Path(__file__).parents[0]
+
+# seconds per shard between worker starts, Discord allows one login per 5s
+IDENTIFY_DELAY = 5.5
+RESTART_DELAY = 10  # seconds before a crashed worker is started again
+STOP_TIMEOUT = 30  # seconds a worker gets to shut down, above SHUTDOWN_TIMEOUT
+
+
+def recommended_shards(token):
+    response = requests.get(
+        "https://discord.com/api/v10/gateway/bot",
+        headers={"Authorization": f"Bot {token}"},
+        timeout=10,
+    )
+    response.raise_for_status()
+    return response.json()["shards"]
+
+
+def shard_ranges(shards, workers):
+    """Split shards 0..shards-1 into `workers` contiguous ranges."""
+    per_worker, extra = divmod(shards, workers)
+    ranges = []
+    start = 0
+    for worker_id in range(workers):
+        end = start + per_worker + (1 if worker_id < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+def spawn(worker_id, workers, shards, shard_ids):
+    env = dict(
+        os.environ,
+        WORKER_ID=str(worker_id),
+        WORKERS=str(workers),
+        SHARD_COUNT=str(shards),
+        SHARD_IDS=",".join(str(shard_id) for shard_id in shard_ids),
+    )
+    print(f"starting worker {worker_id} with shards {env['SHARD_IDS']}")
+    # in a session of its own, a Ctrl+C in the terminal only reaches us and each
+    # worker gets a single SIGTERM below, a second one would skip its shutdown
+    return subprocess.Popen(
+        [sys.executable, str(cwd / "main.py")], env=env, start_new_session=True
+    )
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument(
+        "--shards", type=int, help="defaults to Discord's recommendation"
+    )
+    args = parser.parse_args(argv)
+
+    load_dotenv(cwd.parent / ".env")
+    try:
+        settings = Settings.load(cwd.parent / "config" / "secrets.json")
+    except ConfigError as error:
+        sys.exit(f"{error}")
+    if args.workers > 1 and settings.rate_limit_backend == "local":
+        sys.exit("RATE_LIMIT_BACKEND=local cannot be shared by several workers")
+
+    shards = args.shards or recommended_shards(settings.token)
+    workers = min(args.workers, shards)  # a worker without shards has nothing to do
+    ranges = shard_ranges(shards, workers)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    processes = {}
+    restart_on = {}  # worker id -> time to start it again
+    for worker_id, shard_ids in enumerate(ranges):
+        if stopping:
+            break
+        processes[worker_id] = spawn(worker_id, workers, shards, shard_ids)
+        # staggered, so the workers' shards do not all log in at once
+        time.sleep(IDENTIFY_DELAY * len(shard_ids))
+
+    while processes and not stopping:
+        time.sleep(1)
+        for worker_id, process in list(processes.items()):
+            code = process.poll()
+            if code is None:
+                continue
+            if code == 0:  # stopped on purpose, e.g. with -logout
+                print(f"worker {worker_id} stopped")
+                del processes[worker_id]
+            elif worker_id not in restart_on:
+                print(f"worker {worker_id} exited with {code}, restarting")
+                restart_on[worker_id] = time.monotonic() + RESTART_DELAY
+            elif time.monotonic() >= restart_on[worker_id]:
+                del restart_on[worker_id]
+                processes[worker_id] = spawn(
+                    worker_id, workers, shards, ranges[worker_id]
+                )
+
+    for process in processes.values():
+        if process.poll() is None:
+            process.terminate()
+    deadline = time.monotonic() + STOP_TIMEOUT
+    for process in processes.values():
+        try:
+            process.wait(max(0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,17 +1,35 @@
 #!/bin/env python3
 # top
-import os
+import signal, sys
 import nextcord  # For discord
 from nextcord.ext import commands  # For commands
 from pathlib import Path  # For paths
 from datetime import datetime  # For date and time
 from random import choice
-import json, logging, asyncpg, pytz, traceback
-import hashlib  # for hashing flag
+import asyncio, io, json, logging, asyncpg, pytz, time
+import hmac  # for comparing flag hashes
 from dotenv import load_dotenv
 
-from server import server_thread
+# server (aiohttp.web, jinja2) and yaml are imported where they are first
+# used, so they load while the gateway connects, see bench/startup_bench.py
+from scoreboard import Scoreboard
+from migrate import migrate
+from announce import Announcer, Outbox, embed_batches
+from ratelimit import Limit, LocalBackend, PostgresBackend, RateLimited, RateLimiter
 from constants import colors, description
+from database import Database
+from flagcache import FlagCache
+from challengeindex import ChallengeIndex
+from members import MemberRegistry
+from auditlog import SubmissionLog
+from hashing import FlagHasher
+from hints import Hints, parse_unlock
+from scheduler import Scheduler, parse_time
+from jobs import Jobs
+from config import Channels, ConfigError, Settings
+import metrics  # served on /metrics
+import console  # -execute
+from errors import ErrorReporter
 
 NPT = pytz.timezone("Asia/Kathmandu")
 # NPT holds the date and time data according to time zone of Asia/Kathmandu
@@ -23,39 +41,145 @@ cwd = str(cwd)
 
 load_dotenv(cwd + "/../.env")
 # Defining a few things
-secret_file = json.load(open(cwd + "/../config/secrets.json"))
+try:
+    # from config vars set in Heroku, see config.py
+    settings = Settings.load(cwd + "/../config/secrets.json")
+except ConfigError as error:
+    sys.exit(f"{error}")  # report everything that is wrong at once
 
 intents = nextcord.Intents.default()
 intents.message_content = True
+intents.members = True  # for on_member_join and -sync, a privileged intent
 
 help_cmd = commands.DefaultHelpCommand(sort_commands=False)
 
-bot = commands.Bot(
+# shards are split between processes by launch.py, see config.py
+bot = commands.AutoShardedBot(
     command_prefix="-",
     case_insensitive=True,
-    owner_ids=set(secret_file["OWNER_IDS"]),
+    owner_ids=set(settings.owner_ids),
     description=description,
     help_command=help_cmd,
     intents=intents,
+    chunk_guilds_at_startup=False,  # member lists are only needed by -sync
+    shard_count=settings.shard_count or None,
+    shard_ids=settings.shards,
+    # slash commands are registered with Discord by worker 0 alone
+    rollout_register_new=settings.worker_id == 0,
+    rollout_update_known=settings.worker_id == 0,
+    rollout_delete_unknown=settings.worker_id == 0,
 )
 logging.basicConfig(level=logging.INFO)  # shows logging info on the console
+log = logging.getLogger(__name__)
+
+bot.settings = settings
+bot.config_token = settings.token
+bot.channels = Channels(settings)  # channel objects, resolved once in on_ready
+
+MAX_IMPORT_SIZE = 1024 * 1024  # biggest file accepted by -add challenges
+EXECUTE_PAGE_SIZE = 4000  # characters of -execute output per embed
+EXECUTE_MAX_PAGES = 5  # longer output is attached as a file
+
+# one connection pool shared by every command, created before the bot logs in
+bot.db = Database(
+    settings.database_url,
+    min_size=settings.db_pool_min_size,
+    max_size=settings.db_pool_max_size,
+    acquire_timeout=settings.db_acquire_timeout,
+    statement_cache_size=settings.db_statement_cache_size,
+)
+bot.flag_cache = FlagCache(bot.db)  # hashed flags, kept in sync with LISTEN/NOTIFY
+bot.challenge_index = ChallengeIndex(bot.db)  # for slash command autocomplete
+bot.members = MemberRegistry(bot.db)  # registered member ids, same sync
+bot.scoreboard = Scoreboard(bot.db, min_interval=settings.scoreboard_refresh_interval)
+bot.submission_log = SubmissionLog(
+    bot.db,
+    on_flush=bot.scoreboard.request_refresh,  # attempt counts changed
+    max_batch=settings.submission_log_batch,
+    flush_interval=settings.submission_log_interval,
+    max_queue=settings.submission_log_queue,
+)
+
+
+async def get_channel(channel_id):
+    return bot.get_channel(channel_id) or await bot.fetch_channel(channel_id)
+
+
+async def is_registered(ctx):
+    """Checked before any database work, unregistered users are told how to register."""
+    if ctx.author.id in bot.members:
+        return True
+    await ctx.channel.send(
+        f"You have to register first: send `-accept <rollnum_nickname>` in <#{bot.settings.new_members_channel}>."
+    )
+    return False
+
+
+# announcements are sent in the background, see announce.py
+bot.announcer = Announcer(solve_window=settings.solve_announce_window)
+if settings.workers > 1:
+    # queued in Postgres by every worker and sent by worker 0 alone
+    bot.announcer = Outbox(
+        bot.db,
+        bot.announcer if settings.worker_id == 0 else None,
+        get_channel=get_channel,
+    )
+
+
+def hint_released(hint_id, challenge_id, body):
+    embed = nextcord.Embed(
+        title="Hint released!",
+        description=f"A new hint for challenge {challenge_id} is out:",
+        color=choice(bot.color_list),
+    )
+    embed.add_field(name=f"HINT #{hint_id}:", value=body, inline=False)
+    bot.announcer.send(bot.channels.challenges_channel, embed=embed)
 
-# from config vars set in Heroku:
-DB_URI = os.getenv("DATABASE_URL")
-bot.config_token = os.getenv("TOKEN")
 
-BOT_ERROR_LOG = int(os.getenv("BOT_ERROR_LOG"))  # used to send exceptions/errors raised
-MOD_CHANNEL = int(os.getenv("MOD_CHANNEL"))  # used in -execute command
-ADD_CHALLENGES_CHANNEL = int(
-    os.getenv("ADD_CHALLENGES_CHANNEL")
-)  # used in -add challenge command
-CHALLENGE_SOLVES_CHANNEL = int(
-    os.getenv("CHALLENGE_SOLVES_CHANNEL")
-)  # used to send updates about challenge solves
-CHALLENGES_CHANNEL = int(os.getenv("CHALLENGES_CHANNEL"))  # used to publish challanges
-NEW_MEMBERS_CHANNEL = int(os.getenv("NEW_MEMBERS_CHANNEL"))
-EXISTING_MEMBERS_CHANNEL = int(os.getenv("EXISTING_MEMBERS_CHANNEL"))
-BOT_UPDATES_CHANNEL = int(os.getenv("BOT_UPDATES_CHANNEL"))
+# command errors, grouped before they are posted to BOT_ERROR_LOG
+bot.error_reporter = ErrorReporter(
+    lambda: bot.channels.bot_error_log if bot.channels.ready else None,
+    window=settings.error_report_window,
+)
+
+# one task and one heap for everything that happens at a set time
+bot.scheduler = Scheduler()
+bot.hints = Hints(bot.db, bot.scheduler, NPT, on_release=hint_released)
+bot.jobs = Jobs(bot.db, bot.scheduler)  # scheduled publishing, see publish_chal
+
+# -flag attempts per user and per (user, challenge), shared by all replicas
+bot.flag_limiter = RateLimiter(
+    LocalBackend()
+    if settings.rate_limit_backend == "local"
+    else PostgresBackend(bot.db),
+    user=Limit(burst=settings.flag_limit_user_burst, per=settings.flag_limit_user_per),
+    challenge=Limit(
+        burst=settings.flag_limit_challenge_burst,
+        per=settings.flag_limit_challenge_per,
+    ),
+)
+bot.web = None  # created in setup(), runs on the bot's loop
+
+# gauges read from the components above whenever /metrics is scraped
+metrics.Gauge(
+    "ctfbot_db_pool_connections",
+    "Pooled database connections by state.",
+    ("state",),
+    collect=lambda: [
+        ({"state": "in_use"}, bot.db.stats()["in_use"]),
+        ({"state": "idle"}, bot.db.stats()["idle"]),
+    ],
+)
+metrics.Gauge(
+    "ctfbot_queue_depth",
+    "Items waiting in the bot's background queues.",
+    ("queue",),
+    collect=lambda: [
+        ({"queue": "submissions"}, bot.submission_log.depth),
+        ({"queue": "announcements"}, bot.announcer.depth),
+    ],
+)
+logging.getLogger("nextcord.http").addFilter(metrics.RateLimitCounter())
 
 
 bot.colors = colors
@@ -64,17 +188,211 @@ bot.color_list = [c for c in bot.colors.values()]
 
 
 # begin---
-def hash(flag):
-    md = hashlib.md5(flag.encode("ascii"))
-    salted = md.hexdigest() + flag
-    hashed = hashlib.sha256(salted.encode("ascii"))
-    return hashed.hexdigest().split("\n")[0]
+# flags are hashed with scrypt in a small thread pool, see hashing.py
+bot.hasher = FlagHasher(workers=settings.flag_hash_workers)
+
+
+async def rehash_flag(challenge_id, flag, old_hash):
+    """Upgrade a flag stored with an old hash scheme after it was solved."""
+    new_hash = await bot.hasher.hash(flag)
+
+    async with bot.db.acquire() as conn:
+        async with conn.transaction():
+            status = await conn.execute(
+                """
+                UPDATE flags
+                    SET flag = $1
+                        WHERE challenge_id = $2 AND flag = $3
+                """,
+                new_hash,
+                challenge_id,
+                old_hash,
+            )
+            await bot.flag_cache.notify(conn, challenge_id)
+
+    if status == "UPDATE 1":
+        bot.flag_cache.set(challenge_id, new_hash)
+
+
+async def record_solve(ctx, challenge_id, hashed_flag):
+    """Returns (correct, first_solve, points, status), see record_solve()."""
+    async with bot.db.acquire() as conn:
+        return await conn.fetchrow(
+            "SELECT * FROM record_solve($1, $2, $3, $4, $5)",
+            challenge_id,
+            hashed_flag,
+            ctx.author.id,
+            datetime.now(NPT).replace(microsecond=0, tzinfo=None),
+            ctx.message.id,
+        )
+
+
+async def start_web():
+    from server import WebServer
+
+    bot.web = WebServer(
+        bot.db, bot.scoreboard, NPT, port=settings.port + settings.worker_id
+    )
+    await bot.web.start()
+
+
+# everything that has to be in place before commands are handled, runs while
+# the bot logs in
+async def setup():
+    start = time.perf_counter()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:  # replaces bot.run()'s handlers, which stop the loop at once
+            bot.loop.add_signal_handler(signum, on_signal, signal.Signals(signum).name)
+        except NotImplementedError:  # not on Windows
+            pass
+    await bot.db.connect()
+    async with bot.db.acquire() as conn:
+        await migrate(conn)  # bring the schema up to date, see migrations/
+    await asyncio.gather(
+        bot.flag_cache.load(),
+        bot.flag_cache.listen(),
+        bot.challenge_index.load(),
+        bot.challenge_index.listen(),
+        bot.members.load(),
+        bot.members.listen(),
+        bot.hints.load(),
+        bot.jobs.start(),
+        start_web(),
+    )
+    bot.submission_log.start()
+    bot.scoreboard.start()
+    bot.loop.create_task(metrics.monitor_loop_lag())
+    log.info("setup done in %.2fs", time.perf_counter() - start)
+
+
+bot.setup_task = None  # setup() once the bot runs
+bot.setup_failed = False  # exit non-zero, so launch.py starts the worker again
+
+
+async def wait_for_setup():
+    if bot.setup_task is not None:
+        await asyncio.shield(bot.setup_task)
+
+
+async def wait_until_ready():
+    """Commands write first and announce after, so both must be there."""
+    await wait_for_setup()
+    await bot.channels.wait()  # resolved in on_ready
+
+
+def stop_if_setup_failed(task):
+    if not task.cancelled() and task.exception() is not None:
+        log.critical("setup failed", exc_info=task.exception())
+        bot.setup_failed = True
+        bot.loop.create_task(bot.close())
+
+
+# graceful shutdown, on -logout and on SIGTERM/SIGINT (redeploys, launch.py)
+bot.stopping = False  # no new commands once set
+bot.in_flight = 0  # commands running now
+bot.shutdown_task = None
+
+
+class ShuttingDown(commands.CheckFailure):
+    """Raised for commands that arrive after a shutdown has started."""
+
+
+def request_shutdown(reason):
+    if bot.shutdown_task is None:
+        log.info("shutting down: %s", reason)
+        bot.stopping = True
+        bot.shutdown_task = bot.loop.create_task(shutdown())
+    return bot.shutdown_task
+
+
+def on_signal(name):
+    if bot.shutdown_task is not None:
+        log.warning("%s again, stopping without waiting", name)
+        bot.loop.stop()
+    else:
+        request_shutdown(name)
+
+
+async def shutdown():
+    """
+    Stop taking commands, give the running ones until SHUTDOWN_TIMEOUT to
+    finish, flush queued writes, then close everything and disconnect.
+    """
+    deadline = time.monotonic() + bot.settings.shutdown_timeout
+
+    def remaining():
+        return max(1.0, deadline - time.monotonic())
+
+    if bot.setup_task is not None and not bot.setup_task.done():
+        bot.setup_task.cancel()
+    while bot.in_flight and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+    if bot.in_flight:
+        log.warning("stopping with %d commands still running", bot.in_flight)
+
+    await bot.submission_log.close(remaining())  # flush queued submissions first
+    await bot.announcer.close(remaining())
+    if bot.web is not None:
+        try:
+            await asyncio.wait_for(bot.web.close(), remaining())
+        except asyncio.TimeoutError:
+            log.warning("web server did not stop in time")
+    await bot.scheduler.close()
+    await bot.error_reporter.close()
+    await bot.scoreboard.close()
+    try:  # waits for every connection to be released, stuck commands hold some
+        await asyncio.wait_for(bot.db.close(), remaining())
+    except asyncio.TimeoutError:
+        log.warning("database pool did not close in time, terminating it")
+        bot.db.terminate()
+    bot.hasher.close()
+    await bot.close()
+
+
+# a command that arrives before setup() is done and the channels are known
+# waits for them, none start once a shutdown has begun
+@bot.check
+async def accepting_commands(ctx):
+    if bot.stopping:
+        raise ShuttingDown()
+    await wait_until_ready()
+    return True
+
+
+# time every command, see metrics.py, and count the running ones for shutdown()
+@bot.before_invoke
+async def start_timer(ctx):
+    ctx.started_on = time.perf_counter()
+    bot.in_flight += 1
+
+
+@bot.after_invoke
+async def record_latency(ctx):
+    bot.in_flight -= 1
+    metrics.command_seconds.observe(
+        time.perf_counter() - ctx.started_on, command=ctx.command.qualified_name
+    )
 
 
 # whenever the bot is ready/online this will be triggered
 # on_ready
 @bot.event
 async def on_ready():
+    await wait_for_setup()
+    if not bot.channels.ready:
+        try:
+            await bot.channels.resolve(bot)
+        except ConfigError as error:
+            # better to stop now than to fail on the first solve
+            log.critical("%s", error)
+            await bot.close()
+            return
+
+    if isinstance(bot.announcer, Outbox):
+        await bot.announcer.start()
+    # hints and challenges are announced, so not before the channels are known
+    bot.scheduler.start()
+
     print(
         f"-----\nLogged in as: {bot.user.name} : {bot.user.id}\n-----\nCurrent prefix: -\n-----"
     )
@@ -84,8 +402,10 @@ async def on_ready():
             name=f"Hi, I am {bot.user.name}.\nUse prefix `-` to interact with me. For example: `-help`."
         )
     )  # This changes the bot's 'activity' that is see on profile pop-up
-    channel = bot.get_channel(BOT_UPDATES_CHANNEL)
-    await channel.send("Hey all, I'm back online! :smiley:")
+    if bot.settings.worker_id == 0:  # once, not once per worker
+        bot.announcer.send(
+            bot.channels.bot_updates_channel, "Hey all, I'm back online! :smiley:"
+        )
 
 
 # on_member_join
@@ -115,8 +435,11 @@ async def on_member_join(member):
     )
 
     # embed.set_thumbnail(url=ctx.author.avatar_url)
-    embed.set_author(name=member.name, icon_url=member.avatar_url)
-    embed.set_footer(text=member.guild, icon_url=member.guild.icon_url)
+    embed.set_author(name=member.name, icon_url=member.display_avatar.url)
+    embed.set_footer(
+        text=member.guild,
+        icon_url=member.guild.icon.url if member.guild.icon is not None else None,
+    )
 
     await member.create_dm()
     await member.dm_channel.send(embed=embed)
@@ -160,7 +483,8 @@ async def logout(ctx):
     If the user running the command owns the bot then this will disconnect the bot from nextcord. For development purpose only.
     """
     await ctx.send(f"Hey {ctx.author.mention}, I am now logging out :wave:")
-    await bot.logout()
+    # in the background, it waits for running commands, this one included
+    request_shutdown(f"-logout by {ctx.author}")
 
 
 # ----------------------------------------------------------------------------
@@ -188,7 +512,7 @@ async def _add(ctx):
 
     Add a CTF challenge and a flag for it.
     """
-    # if ctx.channel.id != ADD_CHALLENGES_CHANNEL:    #id of bot-test channel in CTF
+    # if ctx.channel.id != bot.settings.add_challenges_channel:    #id of bot-test channel in CTF
     #     return
 
     await ctx.channel.send(
@@ -205,39 +529,32 @@ async def add_challenge(ctx, category, *, description):
 
     Add a CTF challenge by sending the challenge in the given format.
     """
-    if ctx.channel.id != ADD_CHALLENGES_CHANNEL:
+    if ctx.channel.id != bot.settings.add_challenges_channel:
+        return
+    if not await is_registered(ctx):
         return
     try:
-        conn = await asyncpg.connect(DB_URI)
-
-        async with conn.transaction():
-            await conn.execute(
+        async with bot.db.acquire() as conn:
+            chal_id = await conn.fetchval(
                 """
                 INSERT INTO challenges (
                     author_id,
                     added_on,
-                    category, 
+                    category,
                     challenge_description,
                     messsage_id
-                ) 
+                )
                 VALUES ($1, $2, $3, $4, $5)
+                RETURNING challenge_id
                 """,
                 ctx.author.id,
                 datetime.now(NPT).replace(microsecond=0, tzinfo=None),
                 category,
                 description,
                 ctx.message.id,
-            )
+            )  # RETURNING gives us our own id, even when others add challenges at the same time
+            await bot.challenge_index.notify(conn, [chal_id])
 
-        chal_id = await conn.fetchval(
-            """
-            SELECT challenge_id 
-                FROM challenges 
-                    WHERE challenge_id = (SELECT MAX(challenge_id) FROM challenges)
-        """
-        )  # MAX() function is used so that the id with the highest or max value is returned, i.e. the latest added challenge
-
-        await conn.close()
         # await ctx.message.add_reaction('✅')
         await ctx.channel.send(
             f"{ctx.author.mention} Your challenge was added as id: {chal_id}. Send publish command with this id when you are ready to publish it!"
@@ -250,6 +567,84 @@ async def add_challenge(ctx, category, *, description):
         )
 
 
+# add_challenges
+# challenges (bulk)
+@_add.command(name="challenges", aliases=["chals", "import"])
+async def add_challenges(ctx):
+    """
+    Add many challenges at once from an attached file.
+
+    Attach a YAML or JSON file with a list of challenges, each with a `category` and a `description`. All of them are added together, or none of them are.
+    """
+    if ctx.channel.id != bot.settings.add_challenges_channel:
+        return
+    if not await is_registered(ctx):
+        return
+
+    if not ctx.message.attachments:
+        await ctx.channel.send(
+            "Attach a YAML or JSON file with your challenges. Type `-help add challenges` for help."
+        )
+        return
+
+    attachment = ctx.message.attachments[0]
+    if attachment.size > MAX_IMPORT_SIZE:
+        await ctx.channel.send("That file is too big for me.")
+        return
+
+    import yaml  # only needed here
+
+    try:
+        raw = await attachment.read()
+        if attachment.filename.endswith(".json"):
+            data = json.loads(raw)
+        else:
+            data = yaml.safe_load(raw)
+
+        if isinstance(data, dict):
+            data = data.get("challenges")
+        categories = [str(chal["category"]) for chal in data]
+        descriptions = [str(chal["description"]) for chal in data]
+        if not categories:
+            raise ValueError("no challenges")
+
+    except (ValueError, TypeError, KeyError, yaml.YAMLError):
+        await ctx.channel.send(
+            "I could not read any challenges from that file. Type `-help add challenges` for help."
+        )
+        return
+
+    async with bot.db.acquire() as conn:
+        # a single statement, so either every challenge is added or none is
+        chal_ids = await conn.fetch(
+            """
+            INSERT INTO challenges (
+                author_id,
+                added_on,
+                category,
+                challenge_description,
+                messsage_id
+            )
+            SELECT $1, $2, category, description, $3
+                FROM unnest($4::TEXT[], $5::TEXT[]) AS c(category, description)
+            RETURNING challenge_id
+            """,
+            ctx.author.id,
+            datetime.now(NPT).replace(microsecond=0, tzinfo=None),
+            ctx.message.id,
+            categories,
+            descriptions,
+        )
+        await bot.challenge_index.notify(
+            conn, [row["challenge_id"] for row in chal_ids]
+        )
+
+    ids = ", ".join(str(row["challenge_id"]) for row in chal_ids)
+    await ctx.channel.send(
+        f"{ctx.author.mention} Your {len(chal_ids)} challenges were added as ids: {ids}. Add their flags and publish them when you are ready, `-publish` takes several ids at once!"
+    )
+
+
 # ----------------------------------------------------------------------------
 
 # add_flag
@@ -265,44 +660,47 @@ async def add_flag(ctx, challenge_id, flag):
     # try:
     challenge_id = int(challenge_id)
 
-    conn = await asyncpg.connect(DB_URI)
+    async with bot.db.acquire() as conn:
+        data = await conn.fetchval(
+            """
+            SELECT author_id
+                FROM challenges
+                    WHERE challenge_id = $1
+        """,
+            challenge_id,
+        )
 
-    data = await conn.fetchval(
-        """
-        SELECT author_id 
-            FROM challenges 
-                WHERE challenge_id = $1
-    """,
-        challenge_id,
-    )
+    if data is not None and int(data) == int(ctx.author.id):
+        # only for the author, and without holding a connection meanwhile
+        hashed_flag = await bot.hasher.hash(flag)
+        async with bot.db.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    """
+                    INSERT INTO flags(
+                        challenge_id,
+                        added_on,
+                        flag,
+                        message_id
+                    )
+                    VALUES($1, $2, $3, $4)
+                    """,
+                    challenge_id,
+                    datetime.now(NPT).replace(microsecond=0, tzinfo=None),
+                    hashed_flag,
+                    ctx.message.id,
+                )
+                await bot.flag_cache.notify(conn, challenge_id)
 
-    if int(data) == int(ctx.author.id):
-        hashed_flag = hash(flag)
+            bot.flag_cache.set(challenge_id, hashed_flag)
 
-        async with conn.transaction():
-            await conn.execute(
-                """
-                INSERT INTO flags(
-                    challenge_id, 
-                    added_on,
-                    flag,
-                    message_id
-                )
-                VALUES($1, $2, $3, $4)
-                """,
-                challenge_id,
-                datetime.now(NPT).replace(microsecond=0, tzinfo=None),
-                hashed_flag,
-                ctx.message.id,
-            )
+    if data is None:
+        await ctx.channel.send("There is no challenge with that id.")
 
-        await conn.close()
+    elif int(data) == int(ctx.author.id):
         await ctx.message.add_reaction("🚩")
         await ctx.channel.send(f"Congrats! Your flag has been added!")
 
-    elif data is None:
-        await ctx.channel.send("There is no challenge with that id.")
-
     else:
         await ctx.channel.send("Don't try to add flag to someone else's challenge!")
 
@@ -312,6 +710,55 @@ async def add_flag(ctx, challenge_id, flag):
     #     await channel.send(f"error on command `-add flag`: {e}")
 
 
+# add_hint
+# hint
+@_add.command(name="hint")
+@commands.dm_only()
+async def add_hint(ctx, challenge_id: int, unlock, *, hint):
+    """
+    Add a hint for the challenge you added.
+
+    `unlock` is a point cost (`50`), a delay (`+30m`, `+2h`, `+1d`) or a time (`2026-10-18T20:00`). Hints with a delay or a time are posted in the challenges channel when it comes, hints with a cost are unlocked with `-hint <id>`. A cost of `0` makes the hint free right away.
+    """
+    now = datetime.now(NPT).replace(microsecond=0, tzinfo=None)
+    try:
+        cost, release_on = parse_unlock(unlock, now, NPT)
+    except ValueError:
+        await ctx.channel.send(
+            "I don't know when to unlock that hint. Type `-help add hint` for help."
+        )
+        return
+
+    async with bot.db.acquire() as conn:
+        author_id = await conn.fetchval(
+            "SELECT author_id FROM challenges WHERE challenge_id = $1", challenge_id
+        )
+
+    if author_id is None:
+        await ctx.channel.send("There is no challenge with that id.")
+
+    elif author_id != ctx.author.id:
+        await ctx.channel.send("Don't try to add hints to someone else's challenge!")
+
+    else:
+        hint_id = await bot.hints.add(
+            challenge_id,
+            hint,
+            cost=cost,
+            release_on=release_on,
+            added_on=now,
+            message_id=ctx.message.id,
+        )
+        if release_on is not None:
+            when = f"will be released on {release_on} (NPT)"
+        elif cost:
+            when = f"can be unlocked for {cost} points"
+        else:
+            when = "is free for everyone"
+        await ctx.message.add_reaction("💡")
+        await ctx.channel.send(f"Your hint #{hint_id} was added and {when}.")
+
+
 # --------------------------------------------------------------
 
 # submit
@@ -319,84 +766,89 @@ async def add_flag(ctx, challenge_id, flag):
     name="flag", aliases=["submit", "submit-flag"], invoke_without_command=True
 )
 @commands.dm_only()
-@commands.cooldown(rate=1, per=60, type=commands.BucketType.user)
 async def submit_flag(ctx, challenge_id, flag):
     """
     Submit the captured flag!
 
     Submit flag to check whether it is correct or not.
     """
+    if not await is_registered(ctx):
+        return
     # try:
     challenge_id = int(challenge_id)
+    # no database read needed, unpublished challenges are not there yet
+    challenge = bot.challenge_index.challenges.get(challenge_id)
+    data = None
+    if challenge is not None and challenge.published:
+        data = bot.flag_cache.get(challenge_id)
 
-    conn = await asyncpg.connect(DB_URI)
-
-    data = await conn.fetchval(
-        """
-        SELECT flag 
-            FROM flags 
-                WHERE challenge_id = $1
-    """,
-        challenge_id,
-    )
-
-    hashed_flag = hash(flag)
+    if data is not None and challenge.author_id != ctx.author.id:
+        await bot.flag_limiter.check(ctx.author.id, challenge_id)
+        # hashed with the same scheme and salt as the stored flag
+        hashed_flag = await bot.hasher.digest(flag, data)
 
     if data is None:
         await ctx.channel.send("There is no challenge with that id.")
 
-    elif str(data) == hashed_flag:  # place here hash
-        async with conn.transaction():
-            await conn.execute(
-                """
-                INSERT INTO solvers (
-                    challenge_id, 
-                    member_id, 
-                    solved_on, 
-                    message_id_on_success
-                )
-                VALUES ($1, $2, $3, $4)
-                """,
-                challenge_id,
-                ctx.author.id,
-                datetime.now(NPT).replace(microsecond=0, tzinfo=None),
-                ctx.message.id,
+    elif challenge.author_id == ctx.author.id:
+        await ctx.channel.send("You can't solve your own challenge!")
+
+    elif hmac.compare_digest(hashed_flag, data):
+        # the flag, the author and publishing are checked again, the solve
+        # scored and recorded in one call to record_solve() (migration 0009),
+        # so a stale cache, a double-click or two solvers at once cannot race
+        result = await record_solve(ctx, challenge_id, hashed_flag)
+
+        if result["status"] == "wrong":
+            # the flag was changed, or rehashed by another replica (see
+            # rehash_flag), and our cache has not caught up yet: check it
+            # once more against the hash that is stored now
+            await bot.flag_cache.refresh(challenge_id)
+            fresh = bot.flag_cache.get(challenge_id)
+            if fresh is not None and fresh != data:
+                data = fresh
+                hashed_flag = await bot.hasher.digest(flag, data)
+                if hmac.compare_digest(hashed_flag, data):
+                    result = await record_solve(ctx, challenge_id, hashed_flag)
+
+        if result["status"] == "wrong":
+            await ctx.channel.send("That was incorrect. Try again?")
+
+        elif result["status"] == "author":
+            await ctx.channel.send("You can't solve your own challenge!")
+
+        elif result["status"] == "unpublished":
+            await ctx.channel.send("There is no challenge with that id.")
+
+        elif result["status"] == "solved":
+            await ctx.channel.send("You have already solved this challenge!")
+
+        else:
+            bot.scoreboard.request_refresh()
+            await ctx.message.add_reaction("🚩")
+            await ctx.channel.send(
+                f"Wow! Your flag is correct! You got {result['points']} points."
             )
 
-        await conn.close()
-        await ctx.message.add_reaction("🚩")
-        await ctx.channel.send(f"Wow! Your flag is correct!")
+            bot.announcer.solve(
+                bot.channels.challenge_solves_channel,
+                f"{ctx.author.mention} just solved the challenge with id: {challenge_id} for {result['points']} points!",
+            )
 
-        channel = bot.get_channel(
-            CHALLENGE_SOLVES_CHANNEL
-        )  # to send the below message to this channel
-        await channel.send(
-            f"{ctx.author.mention} just solved the challenge with id: {challenge_id}!"
-        )
+        if result["correct"] and bot.hasher.needs_rehash(data):
+            await rehash_flag(challenge_id, flag, data)
 
     else:
         await ctx.channel.send("That was incorrect. Try again?")
 
-        async with conn.transaction():
-            await conn.execute(
-                """
-                INSERT INTO submissions (
-                    challenge_id,
-                    member_id,
-                    submitted_flags,
-                    added_on,
-                    message_id
-                )
-                VALUES ($1, $2, $3, $4, $5)
-                """,
-                challenge_id,
-                ctx.author.id,
-                flag,
-                datetime.now(NPT).replace(microsecond=0, tzinfo=None),
-                ctx.message.id,
-            )
-
-        await conn.close()
+        # written in bulk by the background writer, see auditlog.py
+        await bot.submission_log.add(
+            challenge_id,
+            ctx.author.id,
+            flag,
+            datetime.now(NPT).replace(microsecond=0, tzinfo=None),
+            ctx.message.id,
+        )
 
     # except Exception as e:
     #     # await ctx.channel.send("Please follow the correct syntax.")
@@ -405,70 +857,251 @@ async def submit_flag(ctx, challenge_id, flag):
 
 # ----------------------------------------------------------------------------
 
-# publish
-@bot.command(name="publish")
-async def publish_chal(ctx, challenge_id):
+# hints
+@bot.command(name="hints")
+async def _hints(ctx, challenge_id: int):
     """
-    Publish challenge after adding one.
+    List the hints of a challenge.
 
-    You need to provide valid id of the challenge(s) you added using the given format.
+    Shows released hints and what it takes to get the others.
     """
-    if ctx.channel.id != ADD_CHALLENGES_CHANNEL:
+    hints = await bot.hints.for_challenge(challenge_id)
+
+    lines = []
+    for hint in hints:
+        if hint["released_on"] is not None:
+            lines.append(f"**#{hint['hint_id']}:** {hint['body']}")
+        elif hint["release_on"] is not None:
+            lines.append(f"**#{hint['hint_id']}:** out on {hint['release_on']} (NPT)")
+        else:
+            lines.append(
+                f"**#{hint['hint_id']}:** costs {hint['cost']} points, DM me `-hint {hint['hint_id']}` to unlock it"
+            )
+
+    embed = nextcord.Embed(
+        title=f"Hints for challenge {challenge_id}",
+        description="\n".join(lines) or "This challenge has no hints.",
+        color=choice(bot.color_list),
+    )
+    await ctx.send(embed=embed)
+
+
+# hint
+@bot.command(name="hint", aliases=["unlock"])
+@commands.dm_only()
+async def unlock_hint(ctx, hint_id: int):
+    """
+    Unlock a hint.
+
+    Shows you the hint and takes its cost from your score, only the first time.
+    """
+    if not await is_registered(ctx):
         return
+    hint = await bot.hints.unlock(
+        hint_id, ctx.author.id, datetime.now(NPT).replace(microsecond=0, tzinfo=None)
+    )
+    status = hint["status"]
+
+    if status == "missing":
+        await ctx.channel.send("There is no hint with that id.")
+    elif status == "pending":
+        await ctx.channel.send("That hint is not out yet, it is released for free.")
+    elif status == "unregistered":
+        await ctx.channel.send("You need to register with `-agree` first.")
+    elif status == "poor":
+        await ctx.channel.send(
+            f"That hint costs {hint['cost']} points, you don't have enough yet."
+        )
+    else:
+        charged = f" (-{hint['cost']} points)" if status == "charged" else ""
+        await ctx.channel.send(
+            f"Hint #{hint_id} for challenge {hint['challenge_id']}{charged}:\n{hint['body']}"
+        )
 
-    # else:
-    try:
-        chal_id = int(challenge_id)
 
-        conn = await asyncpg.connect(DB_URI)
+# ----------------------------------------------------------------------------
 
-        data = await conn.fetchrow(
+# publish
+async def publish_challenges(challenge_ids):
+    """
+    Publish challenges and announce them together, in as few messages as
+    Discord allows. Returns the rows of those not published before.
+    """
+    async with bot.db.acquire() as conn:
+        rows = await conn.fetch(
             """
-            SELECT author_id, category, challenge_description 
-                FROM challenges 
-                    WHERE challenge_id = $1
-        """,
-            chal_id,
+            UPDATE challenges
+                SET published_on = $2
+                    WHERE challenge_id = ANY($1::INT[]) AND published_on IS NULL
+            RETURNING challenge_id, author_id, category, challenge_description, points
+            """,
+            challenge_ids,
+            datetime.now(NPT).replace(microsecond=0, tzinfo=None),
         )
+        if rows:
+            await bot.challenge_index.notify(
+                conn, [row["challenge_id"] for row in rows]
+            )
+    if not rows:
+        return rows
 
-        await conn.close()
+    embeds = []
+    for row in sorted(rows, key=lambda row: row["challenge_id"]):
+        embed = nextcord.Embed(
+            title="New challenge published!",
+            description=f"<@{row['author_id']}> just published the following challenge:",
+            color=choice(bot.color_list),
+        )
+        embed.add_field(name="CHALLENGE ID:", value=f"{row['challenge_id']}")
+        embed.add_field(name="CATEGORY:", value=f"{row['category']}")
+        embed.add_field(name="POINTS:", value=f"{row['points']}")
+        embed.add_field(
+            name="DESCRIPTION:",
+            value=f"{row['challenge_description']}",
+            inline=False,
+        )
+        embeds.append(embed)
 
-        if data is None:
-            await ctx.channel.send("There is no challenge with that id.")
+    channel = bot.channels.challenges_channel  # to publicly post the challenge
+    for i, batch in enumerate(embed_batches(embeds)):
+        bot.announcer.send(channel, "@everyone" if i == 0 else None, embeds=batch)
+    await bot.hints.release_due([row["challenge_id"] for row in rows])
+    await bot.web.challenges_changed()
+    return rows
 
-        elif int(data["author_id"]) != int(ctx.author.id):
-            await ctx.channel.send(
-                "Why are you trying to publish someone else's challenge?"
-            )
 
-        else:
-            channel = bot.get_channel(
-                CHALLENGES_CHANNEL
-            )  # to publicly post the challenge
-
-            embed = nextcord.Embed(
-                title="New challenge published!",
-                description=f"{ctx.author.mention} just published the following challenge:",
-                color=choice(bot.color_list),
-            )
-            embed.add_field(name="CHALLENGE ID:", value=f"{chal_id}")
-            # embed.add_field(name="ADDED ON:", value=f"{data['date_added']}")
-            embed.add_field(name="CATEGORY:", value=f"{data['category']}")
-            embed.add_field(
-                name="DESCRIPTION:",
-                value=f"{data['challenge_description']}",
-                inline=False,
-            )
-            await channel.send("@everyone")
-            await channel.send(embed=embed)
+async def publish_due(payloads):
+    challenge_ids = [
+        chal_id for payload in payloads for chal_id in payload["challenge_ids"]
+    ]
+    rows = await publish_challenges(challenge_ids)
+    log.info("published %d scheduled challenges", len(rows))
+
 
-            await ctx.message.add_reaction("✅")
-            await ctx.channel.send("Wohoo! Your challenge is now published!")
+bot.jobs.register("publish", publish_due)
 
+
+@bot.command(name="publish")
+async def publish_chal(ctx, challenge_ids, when=None):
+    """
+    Publish challenge after adding one.
+
+    You need to provide valid id of the challenge(s) you added using the given format. Separate several ids with commas (`4,5,6`) to publish them together. Add a delay (`+30m`, `+2h`, `+1d`) or a time (`2026-10-18T20:00`, NPT) to publish them then instead of now.
+    """
+    if ctx.channel.id != bot.settings.add_challenges_channel:
+        return
+
+    # else:
+    try:
+        chal_ids = sorted({int(chal_id) for chal_id in challenge_ids.split(",")})
+        now = datetime.now(NPT).replace(microsecond=0, tzinfo=None)
+        publish_on = parse_time(when, now, NPT) if when is not None else None
     except ValueError:
         await ctx.send("You should send me the challenge id to publish.")
         # raise error
         # await ctx.channel.send("You didn't provide the challenge number to publish")
+        return
+
+    async with bot.db.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT challenge_id, author_id, published_on
+                FROM challenges
+                    WHERE challenge_id = ANY($1::INT[])
+            """,
+            chal_ids,
+        )
+
+    if len(rows) < len(chal_ids):
+        await ctx.channel.send("There is no challenge with that id.")
+
+    elif any(int(row["author_id"]) != int(ctx.author.id) for row in rows):
+        await ctx.channel.send(
+            "Why are you trying to publish someone else's challenge?"
+        )
+
+    elif all(row["published_on"] is not None for row in rows):
+        await ctx.channel.send("That challenge is already published.")
+
+    elif publish_on is None:
+        await publish_challenges(chal_ids)
+        await ctx.message.add_reaction("✅")
+        await ctx.channel.send("Wohoo! Your challenge is now published!")
+
+    elif publish_on <= now:
+        await ctx.channel.send("That time has passed already.")
+
+    else:
+        # a job, so it still happens if the bot restarts in between
+        await bot.jobs.add(
+            "publish", {"challenge_ids": chal_ids}, NPT.localize(publish_on)
+        )
+        await ctx.message.add_reaction("⏰")
+        await ctx.channel.send(
+            f"Your challenge will be published on {publish_on} (NPT)."
+        )
+
+
+# ----------------------------------------------------------------------------
+
+
+# scoreboard
+@bot.command(name="scoreboard", aliases=["scores", "leaderboard"])
+async def _scoreboard(ctx, limit: int = 10):
+    """
+    Show the top solvers.
+
+    Shows the top members by score (10 by default, at most 25).
+    """
+    rows = await bot.scoreboard.top(max(1, min(limit, 25)))
+
+    embed = nextcord.Embed(
+        title="Scoreboard",
+        description="\n".join(
+            f"**{row['rank']}.** {row['server_nickname']} - {row['score']} points, "
+            f"{row['solves']} solved, "
+            f"{row['first_bloods']} first bloods"
+            for row in rows
+        )
+        or "Nobody has solved anything yet.",
+        color=choice(bot.color_list),
+    )
+    await ctx.send(embed=embed)
+
+
+# stats
+@bot.command(name="stats")
+async def _stats(ctx, user: nextcord.User = None):
+    """
+    Show your (or someone else's) CTF stats.
+
+    Shows rank, score, solves, first bloods and wrong attempts of a member.
+    """
+    user = user or ctx.author
+    row, bloods = await bot.scoreboard.member(user.id)
+
+    if row is None:
+        await ctx.send(f"{user.name} is not registered yet.")
+        return
+
+    embed = nextcord.Embed(
+        title=f"Stats for {row['server_nickname']}",
+        color=choice(bot.color_list),
+    )
+    embed.add_field(name="RANK:", value=f"{row['rank']}")
+    embed.add_field(name="SCORE:", value=f"{row['score']}")
+    embed.add_field(name="SOLVED:", value=f"{row['solves']}")
+    embed.add_field(name="WRONG ATTEMPTS:", value=f"{row['wrong_attempts']}")
+    embed.add_field(
+        name="FIRST BLOODS:",
+        value="\n".join(
+            f"challenge {blood['challenge_id']} on {blood['solved_on']}"
+            for blood in bloods[:10]
+        )
+        or "none",
+        inline=False,
+    )
+    await ctx.send(embed=embed)
 
 
 # ----------------------------------------------------------------------------
@@ -483,7 +1116,7 @@ async def _agree(ctx, rollnum_nickname):
 
     This is to ensure that the person(who issues the command, i.e. author) agrees to abide by the rules and also to add them to the database. After the author gives rollnum_nick, their nickname will be changed to the given rollnum_nick form.
     """
-    if ctx.channel.id != NEW_MEMBERS_CHANNEL:  # new-arrivals channel
+    if ctx.channel.id != bot.settings.new_members_channel:  # new-arrivals channel
         return
 
     # role_id = secret_file['MEMBER_ROLE_ID'] #'members' role
@@ -491,30 +1124,22 @@ async def _agree(ctx, rollnum_nickname):
     # await ctx.author.add_roles(role, reason="Agreed to the rules")
     await ctx.author.edit(nick=rollnum_nickname)
 
-    conn = await asyncpg.connect(DB_URI)
-
-    async with conn.transaction():
-        await conn.execute(
-            """
-            INSERT INTO members (
-                member_id,
-                server_nickname,
-                added_on,
-                message_id
-            )
-            VALUES ($1, $2 , $3, $4)
-            """,
-            ctx.author.id,
-            rollnum_nickname,
-            datetime.now(NPT).replace(microsecond=0, tzinfo=None),
-            ctx.message.id,
-        )
-    await conn.close()
+    new = await bot.members.register(
+        ctx.author.id,
+        rollnum_nickname,
+        datetime.now(NPT).replace(microsecond=0, tzinfo=None),
+        ctx.message.id,
+    )
     # await ctx.channel.send(f"Hey {ctx.author.mention}, you now have been given the role {role.mention}, and take a look at your nickname, it has been changed to __**{rollnum_nickname}**__ in this server!")
     await ctx.message.add_reaction("✅")
-    await ctx.channel.send(
-        f":partying_face: Congratulations {ctx.author.mention}, I added you to our database! And take a look at your new nickname!!\nBy the way, this is what I added: {rollnum_nickname}"
-    )
+    if new:
+        await ctx.channel.send(
+            f":partying_face: Congratulations {ctx.author.mention}, I added you to our database! And take a look at your new nickname!!\nBy the way, this is what I added: {rollnum_nickname}"
+        )
+    else:
+        await ctx.channel.send(
+            f"{ctx.author.mention} You were registered already, I changed your nickname to {rollnum_nickname}."
+        )
 
 
 # ----------------------------------------------------------------------------
@@ -530,7 +1155,7 @@ async def check(ctx, rollnum_nickname):
     # role_id = 749550229115895840 #'members' role
     # role = ctx.guild.get_role(role_id)
     # await ctx.author.add_roles(role, reason="Added to db")
-    if ctx.channel.id != EXISTING_MEMBERS_CHANNEL:  # existing-members channel
+    if ctx.channel.id != bot.settings.existing_members_channel:  # existing-members channel
         return
 
     conn = await asyncpg.connect(DB_URI)
@@ -570,17 +1195,321 @@ async def check(ctx, rollnum_nickname):
 async def execute(ctx, *, query):
     """
     Execute the query. Only for debugging purpose.
+
+    Short results are shown as pages, longer ones, and those with a value too long for a page, are attached as a TSV file. Queries are cancelled after EXECUTE_TIMEOUT seconds and stop at EXECUTE_MAX_ROWS rows or EXECUTE_MAX_BYTES bytes.
     """
-    if ctx.channel.id != MOD_CHANNEL:
+    if ctx.channel.id != bot.settings.mod_channel:
         return
 
-    conn = await asyncpg.connect(DB_URI)
+    query = query.strip().strip("`")  # a ```sql code block``` works too
+    if query[:3].lower() == "sql":
+        query = query[3:]
+    try:
+        async with bot.db.acquire() as conn:
+            result = await console.run_query(
+                conn,
+                query,
+                timeout=bot.settings.execute_timeout,
+                max_rows=bot.settings.execute_max_rows,
+                max_bytes=bot.settings.execute_max_bytes,
+            )
+    except asyncpg.PostgresError as error:
+        await ctx.send(f"Query failed: `{type(error).__name__}: {error}`")
+        return
+
+    try:
+        summary = f"{result.rows} rows in {1000 * result.elapsed:.0f} ms"
+        if result.truncated:
+            summary += f", {result.truncated}"
+
+        found = None  # pages, None when the result goes in a file
+        if (
+            result.status is None
+            and result.size <= EXECUTE_PAGE_SIZE * EXECUTE_MAX_PAGES
+        ):
+            found = console.pages(result.text(), EXECUTE_PAGE_SIZE, EXECUTE_MAX_PAGES)
+
+        if result.status is not None:
+            await ctx.send(f"`{result.status}` in {1000 * result.elapsed:.0f} ms")
+
+        elif found is not None:
+            for number, page in enumerate(found, 1):
+                embed = nextcord.Embed(
+                    title="Query result",
+                    description=f"```\n{page}```",
+                    color=choice(bot.color_list),
+                )
+                embed.set_footer(text=f"page {number}/{len(found)} · {summary}")
+                await ctx.send(embed=embed)
 
-    result = await conn.fetch(query)
+        else:
+            result.output.seek(0)
+            await ctx.send(summary, file=nextcord.File(result.output, "result.tsv"))
+    finally:
+        result.close()
+
+
+# pool
+@bot.command(name="pool", aliases=["dbstats", "internals"], hidden=True)
+@commands.is_owner()
+async def pool_stats(ctx):
+    """
+    Show database pool and background queue usage. Only for debugging purpose.
+    """
+    if ctx.channel.id != bot.settings.mod_channel:
+        return
+
+    embed = nextcord.Embed(
+        title="Internals",
+        color=choice(bot.color_list),
+    )
+    for name, value in bot.db.stats().items():
+        embed.add_field(name=name, value=f"{value}")
+    for name, value in bot.submission_log.stats().items():
+        embed.add_field(name=f"submissions {name}", value=f"{value}")
+    for name, value in bot.announcer.stats().items():
+        embed.add_field(name=f"announce {name}", value=f"{value}")
+    for name, value in bot.error_reporter.stats().items():
+        embed.add_field(name=f"errors {name}", value=f"{value}")
+
+    await ctx.send(embed=embed)
+
+
+# errors
+@bot.command(name="errors", hidden=True)
+@commands.is_owner()
+async def _errors(ctx, fingerprint=None):
+    """
+    Show the latest command errors, or the traceback of one of them by fingerprint.
+    """
+    if ctx.channel.id != bot.settings.mod_channel:
+        return
+
+    reporter = bot.error_reporter
+    if fingerprint is not None:
+        group = reporter.groups.get(fingerprint)
+        if group is None:
+            await ctx.send("I have no error with that fingerprint.")
+            return
+        await ctx.send(
+            f"`{group.fingerprint}` {group.kind}, seen {group.count} times, last: {group.context}",
+            file=nextcord.File(
+                io.BytesIO(group.traceback.encode()), f"traceback-{fingerprint}.txt"
+            ),
+        )
+        return
+
+    lines = []
+    for when, key, context in reversed(reporter.recent):
+        group = reporter.groups.get(key)
+        kind = group.kind if group is not None else "?"
+        lines.append(
+            f"{datetime.fromtimestamp(when, NPT):%H:%M:%S} `{key}` {kind}: {context}"
+        )
+    text = ""
+    for line in lines:  # newest first, as many as fit
+        if len(text) + len(line) > 4000:
+            break
+        text += line + "\n"
+    embed = nextcord.Embed(
+        title=f"Latest errors ({len(reporter.recent)})",
+        description=text or "No errors, nice!",
+        color=choice(bot.color_list),
+    )
+    embed.set_footer(text="-errors <fingerprint> for a traceback")
+    await ctx.send(embed=embed)
 
-    await conn.close()
 
-    await ctx.send(f"{result}")
+# sync
+@bot.command(name="sync", aliases=["sync-members"], hidden=True)
+@commands.is_owner()
+@commands.guild_only()
+async def sync_members(ctx):
+    """
+    Register every member of this server at once, with their server nickname.
+
+    Replaces `-check` for existing members. Registered members whose nickname changed get the new one.
+    """
+    if ctx.channel.id != bot.settings.mod_channel:
+        return
+
+    async with ctx.typing():
+        members = await ctx.guild.chunk()  # fetched in chunks over the gateway
+        added, renamed = await bot.members.reconcile(
+            [(member.id, member.display_name) for member in members if not member.bot],
+            datetime.now(NPT).replace(microsecond=0, tzinfo=None),
+            ctx.message.id,
+        )
+    await ctx.send(
+        f"Synced {len(members)} members: {added} registered, {renamed} renamed, {len(bot.members)} registered in total."
+    )
+
+
+# ----------------------------------------------------------------------------
+
+# slash commands
+# The same handlers as the prefix commands above, answered privately. Every
+# interaction is deferred at once, so slow work never hits Discord's 3 second
+# limit, and challenge ids are autocompleted from bot.challenge_index.
+class _SlashTarget:
+    """Stands in for ctx.channel and ctx.message, replies go to the followup."""
+
+    def __init__(self, id, interaction):
+        self.id = id
+        self.interaction = interaction
+
+    async def send(self, content=None, *, embed=None):
+        kwargs = {"embed": embed} if embed is not None else {}
+        await self.interaction.followup.send(content, ephemeral=True, **kwargs)
+
+    async def add_reaction(self, emoji):
+        pass
+
+    async def delete(self):
+        pass
+
+
+class SlashContext:
+    """The parts of commands.Context the prefix handlers use."""
+
+    def __init__(self, interaction, command):
+        self.command = command
+        self.author = interaction.user
+        self.channel = _SlashTarget(interaction.channel_id, interaction)
+        self.message = _SlashTarget(interaction.id, interaction)  # ids of our rows
+        self.send = self.channel.send
+
+
+async def run_slash(interaction, command, *args, **kwargs):
+    """Run a prefix command's handler for an interaction."""
+    await interaction.response.defer(ephemeral=True)
+    ctx = SlashContext(interaction, command)
+    if bot.stopping:
+        await on_command_error(ctx, ShuttingDown())
+        return
+    await wait_until_ready()
+    start = time.perf_counter()
+    bot.in_flight += 1
+    try:
+        await command.callback(ctx, *args, **kwargs)
+    except RateLimited as error:
+        await on_command_error(ctx, error)
+    except Exception as error:
+        await on_command_error(ctx, commands.CommandInvokeError(error))
+    finally:
+        bot.in_flight -= 1
+    metrics.command_seconds.observe(
+        time.perf_counter() - start, command=command.qualified_name
+    )
+
+
+async def wrong_channel(interaction):
+    """Prefix commands ignore this, an interaction has to be answered."""
+    if interaction.channel_id == bot.settings.add_challenges_channel:
+        return False
+    await interaction.response.send_message(
+        f"Use this in <#{bot.settings.add_challenges_channel}>.", ephemeral=True
+    )
+    return True
+
+
+def challenge_choices(challenges, head=""):
+    return {
+        (head + challenge.label)[:100]: challenge.challenge_id
+        for challenge in challenges
+    }
+
+
+@bot.slash_command(name="add", description="Add a challenge or a flag.")
+async def slash_add(interaction: nextcord.Interaction):
+    pass
+
+
+@slash_add.subcommand(name="challenge", description="Add a challenge.")
+async def slash_add_challenge(
+    interaction: nextcord.Interaction,
+    category: str = nextcord.SlashOption(
+        description="web, pwn, ...", autocomplete=True
+    ),
+    description: str = nextcord.SlashOption(description="The challenge itself"),
+):
+    if not await wrong_channel(interaction):
+        await run_slash(interaction, add_challenge, category, description=description)
+
+
+@slash_add_challenge.on_autocomplete("category")
+async def autocomplete_category(interaction, category: str):
+    await interaction.response.send_autocomplete(
+        bot.challenge_index.categories(category or "")
+    )
+
+
+@slash_add.subcommand(name="flag", description="Add the flag of your challenge.")
+async def slash_add_flag(
+    interaction: nextcord.Interaction,
+    challenge: int = nextcord.SlashOption(
+        description="Id of your challenge", autocomplete=True
+    ),
+    flag: str = nextcord.SlashOption(description="The flag"),
+):
+    await run_slash(interaction, add_flag, challenge, flag)
+
+
+@slash_add_flag.on_autocomplete("challenge")
+async def autocomplete_own_challenge(interaction, challenge):
+    found = bot.challenge_index.search(
+        str(challenge or ""), author_id=interaction.user.id
+    )
+    await interaction.response.send_autocomplete(challenge_choices(found))
+
+
+@bot.slash_command(name="publish", description="Publish your challenges.")
+async def slash_publish(
+    interaction: nextcord.Interaction,
+    challenges: str = nextcord.SlashOption(
+        description="Ids of your challenges, separated by commas", autocomplete=True
+    ),
+    when: str = nextcord.SlashOption(
+        description="A delay (+30m, +2h, +1d) or a time (2026-10-18T20:00, NPT)",
+        required=False,
+        default=None,
+    ),
+):
+    if not await wrong_channel(interaction):
+        await run_slash(interaction, publish_chal, challenges, when)
+
+
+@slash_publish.on_autocomplete("challenges")
+async def autocomplete_unpublished(interaction, challenges: str):
+    # complete the last id of the list
+    head, _, last = (challenges or "").rpartition(",")
+    head = head + "," if head else ""
+    found = bot.challenge_index.search(
+        last, published=False, author_id=interaction.user.id
+    )
+    await interaction.response.send_autocomplete(
+        {
+            (head + challenge.label)[:100]: f"{head}{challenge.challenge_id}"
+            for challenge in found
+        }
+    )
+
+
+@bot.slash_command(name="flag", description="Submit the captured flag!")
+async def slash_flag(
+    interaction: nextcord.Interaction,
+    challenge: int = nextcord.SlashOption(
+        description="Id of the challenge", autocomplete=True
+    ),
+    flag: str = nextcord.SlashOption(description="Your flag, only you see it"),
+):
+    await run_slash(interaction, submit_flag, challenge, flag)
+
+
+@slash_flag.on_autocomplete("challenge")
+async def autocomplete_published(interaction, challenge):
+    found = bot.challenge_index.search(str(challenge or ""), published=True)
+    await interaction.response.send_autocomplete(challenge_choices(found))
 
 
 # ----------------------------------------------------------------------------
@@ -597,6 +1526,8 @@ async def on_command_error(ctx, error):
     error: commands.CommandError
         The Exception raised.
     """
+    metrics.command_errors.inc(command=ctx.command, error=type(error).__name__)
+
     # Ignore these errors
     ignored = (commands.CommandNotFound, commands.UserInputError)
     if isinstance(error, ignored):
@@ -615,10 +1546,13 @@ async def on_command_error(ctx, error):
         await ctx.message.delete()
         await ctx.send("Ssshh! Not here..DM me. :smiley:")
 
+    elif isinstance(error, ShuttingDown):
+        await ctx.send("I am restarting, try again in a minute!")
+
     elif isinstance(error, commands.CheckFailure):
         await ctx.send("Hey! You lack permission to use that command!")
 
-    elif isinstance(error, commands.CommandOnCooldown):
+    elif isinstance(error, (commands.CommandOnCooldown, RateLimited)):
         # If the command is currently on cooldown, trip this
         m, s = divmod(error.retry_after, 60)
         h, m = divmod(m, 60)
@@ -637,47 +1571,30 @@ async def on_command_error(ctx, error):
         await ctx.send(
             "Something does not seem right. Type `-help` if you need any help."
         )
-        channel = bot.get_channel(
-            BOT_ERROR_LOG
-        )  # to send the below message to this channel
-
-        # await channel.send(f"Error encountered by: {ctx.author.name}, {ctx.author.id}\nError encountered in: {ctx.command}\n{error}")
-
-        embed = nextcord.Embed(
-            title="Exception raised",
-            description=f"{ctx.author.name} (id: {ctx.author.id}) encountered the following exception:",
-            color=choice(bot.color_list),
-            inline=False,
+        bot.error_reporter.report(
+            error,
+            f"{ctx.author.name} (id: {ctx.author.id}) in `{ctx.command}`",
         )
-        embed.add_field(name="Command:", value=f"{ctx.command}", inline=False)
-        embed.add_field(name="Detail:", value=f"{error}")
-
-        await channel.send(embed=embed)
 
     else:
-        # All other Errors not returned come here. And we can just print the default TraceBack.
-        # print('Ignoring exception in command {}:'.format(ctx.command), file=sys.stderr)
-        # traceback.print_exception(type(error), error, error.__traceback__, file=sys.stderr)
-
-        channel = bot.get_channel(BOT_ERROR_LOG)
-        # await channel.send(f"Error encountered by: {ctx.author.name}, {ctx.author.id}\nError encountered in: {ctx.command}\n{error}")
-
-        embed = nextcord.Embed(
-            title="Exception raised",
-            description=f"{ctx.author.name}(id: {ctx.author.id}) encountered the following exception:",
-            color=choice(bot.color_list),
-            inline=False,
+        # All other Errors not returned come here, grouped and posted by
+        # bot.error_reporter with their traceback, see errors.py
+        bot.error_reporter.report(
+            error,
+            f"{ctx.author.name} (id: {ctx.author.id}) in `{ctx.command}`",
         )
-        embed.add_field(name="Command:", value=f"{ctx.command}", inline=False)
-        embed.add_field(name="Detail:", value=f"{error}")
-
-        await channel.send(embed=embed)
 
 
 # ----------------------------------------------------------------------------
 
 
-server_thread()
-bot.run(bot.config_token)  # Runs our bot
+# guarded so bench/load_bench.py can import the handlers without logging in
+if __name__ == "__main__":
+    # the pool, caches and web server start while the gateway connects
+    bot.setup_task = bot.loop.create_task(setup())
+    bot.setup_task.add_done_callback(stop_if_setup_failed)
+    bot.run(bot.config_token)  # Runs our bot
+    if bot.setup_failed:
+        sys.exit(1)
 
 # END
@@ -0,0 +1,115 @@
+#!/bin/env python3
+import logging
+
+log = logging.getLogger(__name__)
+
+# NOTIFY channel used whenever members register, the payload is their comma
+# separated ids or empty for "reload everything"
+MEMBERS_CHANNEL = "members_changed"
+
+
+class MemberRegistry:
+    """
+    Process-local set of registered member ids.
+
+    Every row on solvers, submissions and challenges needs its member, so
+    commands check `member_id in registry` before any database work instead
+    of failing on a foreign key. It is filled at startup and kept in sync
+    like FlagCache; members are only ever added.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.ids = set()
+
+    def __contains__(self, member_id):
+        return member_id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    async def load(self):
+        """(Re)load every member id from the database."""
+        async with self.db.acquire() as conn:
+            rows = await conn.fetch("SELECT member_id FROM members")
+        self.ids = {row["member_id"] for row in rows}
+        log.info("member registry loaded %d members", len(self.ids))
+
+    async def register(self, member_id, nickname, added_on, message_id):
+        """Add a member or update their nickname. Returns True if they are new."""
+        async with self.db.acquire() as conn:
+            async with conn.transaction():
+                new = await conn.fetchval(
+                    """
+                    INSERT INTO members (
+                        member_id,
+                        server_nickname,
+                        added_on,
+                        message_id
+                    )
+                    VALUES ($1, $2, $3, $4)
+                    ON CONFLICT (member_id)
+                        DO UPDATE SET server_nickname = EXCLUDED.server_nickname
+                    RETURNING xmax = 0
+                    """,
+                    member_id,
+                    nickname,
+                    added_on,
+                    message_id,
+                )  # xmax is 0 for an inserted row, not for an updated one
+                if new:
+                    await self.notify(conn, [member_id])
+        self.ids.add(member_id)
+        return new
+
+    async def reconcile(self, members, added_on, message_id):
+        """
+        Register every (member_id, nickname) of a guild's member list in one
+        COPY, updating the nicknames that changed. Returns (added, renamed).
+        """
+        async with self.db.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    """
+                    CREATE TEMPORARY TABLE guild_members (
+                        member_id BIGINT NOT NULL,
+                        server_nickname TEXT NOT NULL
+                    ) ON COMMIT DROP
+                    """
+                )
+                await conn.copy_records_to_table("guild_members", records=members)
+                rows = await conn.fetch(
+                    """
+                    INSERT INTO members (
+                        member_id,
+                        server_nickname,
+                        added_on,
+                        message_id
+                    )
+                    SELECT DISTINCT ON (member_id) member_id, server_nickname, $1, $2
+                        FROM guild_members
+                    ON CONFLICT (member_id)
+                        DO UPDATE SET server_nickname = EXCLUDED.server_nickname
+                            WHERE members.server_nickname <> EXCLUDED.server_nickname
+                    RETURNING member_id, xmax = 0 AS new
+                    """,
+                    added_on,
+                    message_id,
+                )
+                added = [row["member_id"] for row in rows if row["new"]]
+                if added:
+                    await self.notify(conn, added)
+        self.ids.update(added)
+        return len(added), len(rows) - len(added)
+
+    async def notify(self, conn, member_ids):
+        """Tell every replica that these members registered (sent on commit)."""
+        await self.db.notify_ids(conn, MEMBERS_CHANNEL, member_ids)
+
+    async def listen(self):
+        """Follow registrations made on every replica."""
+        # notifications missed while disconnected are lost, so reload everything
+        await self.db.listen_ids(MEMBERS_CHANNEL, self._on_notify, self.load)
+
+    def _on_notify(self, member_ids):
+        self.ids.update(member_ids)  # self.ids, not the set load() replaced
@@ -0,0 +1,167 @@
+#!/bin/env python3
+"""
+Prometheus-style metrics, served as text on the web server's /metrics page.
+
+Metrics are plain numbers in dicts, so recording one is a dict update and
+costs far less than the work it measures. A metric is served as soon as it
+is created; the ones below are recorded from where the work happens.
+"""
+import asyncio, logging
+from bisect import bisect_left
+
+# latency buckets in seconds, from 1 ms to 10 s
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+MAX_SERIES = 200  # per metric, further label values are folded into "other"
+
+_metrics = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.series = {}
+        _metrics.append(self)
+
+    def _key(self, labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        if key not in self.series and len(self.series) >= MAX_SERIES:
+            key = ("other",) * len(self.labels)
+        return key
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self.series.items():
+            lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.series[key] = self.series.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value that goes up and down. `collect` can read it when rendering."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), collect=None):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def set(self, value, **labels):
+        self.series[self._key(labels)] = value
+
+    def render(self):
+        if self.collect is not None:
+            for labels, value in self.collect():
+                self.set(value, **labels)
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+        series[0][bisect_left(BUCKETS, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        for key, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + ("+Inf",), counts):
+                cumulative += bucket
+                lines.append(
+                    f"{self.name}_bucket{_label_text(names, key + (bound,))} {cumulative}"
+                )
+            labels = _label_text(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+command_seconds = Histogram(
+    "ctfbot_command_seconds", "Time spent running a bot command.", ("command",)
+)
+command_errors = Counter(
+    "ctfbot_command_errors_total",
+    "Commands that raised an error.",
+    ("command", "error"),
+)
+query_seconds = Histogram(
+    "ctfbot_db_query_seconds", "Database query time by statement.", ("statement",)
+)
+pool_wait_seconds = Histogram(
+    "ctfbot_db_pool_wait_seconds", "Time spent waiting for a pooled connection."
+)
+loop_lag_seconds = Histogram(
+    "ctfbot_event_loop_lag_seconds", "How late the event loop wakes up a sleeping task."
+)
+discord_send_seconds = Histogram(
+    "ctfbot_discord_send_seconds", "Time taken by Discord to accept a message."
+)
+discord_rate_limits = Counter(
+    "ctfbot_discord_rate_limits_total", "HTTP 429 responses received from Discord."
+)
+
+
+def statement_label(query):
+    """A short, stable label for a query: its first 80 characters, whitespace collapsed."""
+    return " ".join(query.split())[:80]
+
+
+def observe_query(record):
+    """asyncpg query logger, installed on every pooled connection."""
+    query_seconds.observe(record.elapsed, statement=statement_label(record.query))
+
+
+class RateLimitCounter(logging.Filter):
+    """Counts the 429s nextcord retries internally, which it only logs."""
+
+    def filter(self, record):
+        if isinstance(record.msg, str) and record.msg.startswith(
+            "We are being rate limited"
+        ):
+            discord_rate_limits.inc()
+        return True
+
+
+async def monitor_loop_lag(interval=0.5):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        loop_lag_seconds.observe(max(0.0, loop.time() - start - interval))
@@ -0,0 +1,146 @@
+#!/bin/env python3
+"""
+Versioned schema migrations.
+
+Every file in migrations/ is named <version>_<name>.sql and is applied once,
+in order, inside its own transaction. Applied versions are recorded in
+`schema_migrations`. The bot runs `migrate()` at startup; it can also be run
+by hand:
+
+    python src/migrate.py            apply pending migrations
+    python src/migrate.py --explain  check that the hot queries use indexes
+"""
+
+import asyncio, json, logging, os, sys
+from pathlib import Path
+
+import asyncpg
+
+log = logging.getLogger(__name__)
+
+MIGRATIONS = Path(__file__).parents[0] / "migrations"
+LOCK_ID = 0x43544642  # pg_advisory_lock key, so replicas never migrate at once
+
+
+def hot_queries():
+    """(name, query) for every query on a hot path, as the bot sends it."""
+    # imported here, the bot runs migrate() before it needs the web server
+    import flagcache, hints, jobs, scoreboard, server
+
+    return [
+        ("flag refresh", flagcache.FLAG_QUERY),
+        ("hints of a challenge", hints.HINTS_QUERY),
+        ("/challenges page", server.retrieve_challenges),
+        ("/challenges page of a category", server.retrieve_category_challenges),
+        ("due jobs", jobs.CLAIM_JOBS),
+        ("scoreboard top", scoreboard.TOP_QUERY),
+        ("scoreboard member", scoreboard.MEMBER_QUERY),
+        ("first bloods of a member", scoreboard.FIRST_BLOODS_QUERY),
+        # the lookup inside take_tokens() (migration 0005), statements in a
+        # function can't be explained from outside
+        (
+            "rate limit bucket",
+            "SELECT tokens, updated_on FROM rate_limits WHERE bucket = $1 FOR UPDATE",
+        ),
+    ]
+
+
+def pending_migrations(applied):
+    for path in sorted(MIGRATIONS.glob("*.sql")):
+        version = int(path.name.split("_", 1)[0])
+        if version not in applied:
+            yield version, path
+
+
+async def migrate(conn):
+    """Apply every migration that has not been applied yet."""
+    await conn.execute("SELECT pg_advisory_lock($1)", LOCK_ID)
+    try:
+        await conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+              version INT PRIMARY KEY,
+              name TEXT NOT NULL,
+              applied_on TIMESTAMP NOT NULL DEFAULT now()
+            )
+            """
+        )
+        applied = {
+            row["version"]
+            for row in await conn.fetch("SELECT version FROM schema_migrations")
+        }
+
+        for version, path in pending_migrations(applied):
+            log.info("applying migration %s", path.name)
+            async with conn.transaction():
+                await conn.execute(path.read_text())
+                await conn.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES ($1, $2)",
+                    version,
+                    path.name,
+                )
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", LOCK_ID)
+
+
+def seq_scans(plan):
+    """Yield the tables a JSON query plan reads with a sequential scan."""
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", ()):
+        yield from seq_scans(child)
+
+
+async def explain(conn, queries):
+    """
+    EXPLAIN every hot query and return the ones that would scan a whole table.
+
+    Sequential scans are discouraged for the check, so a small development
+    database still tells us whether a usable index exists. The plans are
+    generic ones, which the bot's prepared statements may switch to and
+    which can't rely on the arguments.
+    """
+    failures = []
+    async with conn.transaction():
+        await conn.execute("SET LOCAL enable_seqscan = off")
+        await conn.execute("SET LOCAL plan_cache_mode = force_generic_plan")
+        for name, query in queries:
+            params = len((await conn.prepare(query)).get_parameters())
+            await conn.execute(f"PREPARE hot_query AS {query}")
+            arguments = ", ".join(["NULL"] * params)
+            plan = json.loads(
+                await conn.fetchval(
+                    "EXPLAIN (FORMAT JSON) EXECUTE hot_query"
+                    + (f"({arguments})" if params else "")
+                )
+            )[0]["Plan"]
+            await conn.execute("DEALLOCATE hot_query")
+            tables = sorted(set(seq_scans(plan)))
+            if tables:
+                failures.append((name, tables))
+    return failures
+
+
+async def main(argv):
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parents[1] / ".env")
+    conn = await asyncpg.connect(os.getenv("DATABASE_URL"))
+    try:
+        await migrate(conn)
+        if "--explain" not in argv:
+            return 0
+
+        queries = hot_queries()
+        failures = await explain(conn, queries)
+        for name, tables in failures:
+            print(f"FAIL {name}: sequential scan on {', '.join(tables)}")
+        print(f"{len(queries) - len(failures)}/{len(queries)} hot queries use indexes")
+        return 1 if failures else 0
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(main(sys.argv[1:])))
@@ -32,4 +32,4 @@ CREATE TABLE IF NOT EXISTS submissions (
   submitted_flags TEXT NOT NULL,
   added_on TIMESTAMP NOT NULL,
   message_id BIGINT NOT NULL
-);
\ No newline at end of file
+);
@@ -0,0 +1,3 @@
+-- a challenge can be solved by more than one member, but only once by each
+ALTER TABLE solvers DROP CONSTRAINT IF EXISTS solvers_pkey;
+ALTER TABLE solvers ADD PRIMARY KEY (challenge_id, member_id);
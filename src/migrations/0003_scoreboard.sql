@@ -0,0 +1,31 @@
+-- scoreboard, refreshed in the background by the bot after solves (see src/scoreboard.py)
+CREATE MATERIALIZED VIEW IF NOT EXISTS first_bloods AS
+  SELECT DISTINCT ON (challenge_id) challenge_id, member_id, solved_on
+    FROM solvers
+   ORDER BY challenge_id, solved_on;
+CREATE UNIQUE INDEX IF NOT EXISTS first_bloods_challenge_id ON first_bloods (challenge_id);
+CREATE INDEX IF NOT EXISTS first_bloods_member_id ON first_bloods (member_id);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS scoreboard AS
+  SELECT rank() OVER (ORDER BY COALESCE(s.solves, 0) DESC, s.last_solve) AS rank,
+         m.member_id,
+         m.server_nickname,
+         COALESCE(s.solves, 0) AS solves,
+         s.last_solve,
+         COALESCE(f.first_bloods, 0) AS first_bloods,
+         COALESCE(a.attempts, 0) AS wrong_attempts
+    FROM members AS m
+    LEFT JOIN (
+      SELECT member_id, count(*) AS solves, max(solved_on) AS last_solve
+        FROM solvers GROUP BY member_id
+    ) AS s ON s.member_id = m.member_id
+    LEFT JOIN (
+      SELECT member_id, count(*) AS first_bloods
+        FROM first_bloods GROUP BY member_id
+    ) AS f ON f.member_id = m.member_id
+    LEFT JOIN (
+      SELECT member_id, count(*) AS attempts
+        FROM submissions GROUP BY member_id
+    ) AS a ON a.member_id = m.member_id;
+CREATE UNIQUE INDEX IF NOT EXISTS scoreboard_member_id ON scoreboard (member_id);
+CREATE INDEX IF NOT EXISTS scoreboard_rank ON scoreboard (rank);
@@ -0,0 +1,7 @@
+-- indexes for the hot query paths, checked by `python src/migrate.py --explain`
+ALTER TABLE submissions ADD PRIMARY KEY (serial_num);
+CREATE INDEX IF NOT EXISTS submissions_member_challenge ON submissions (member_id, challenge_id);
+CREATE INDEX IF NOT EXISTS submissions_challenge_id ON submissions (challenge_id);
+CREATE INDEX IF NOT EXISTS challenges_author_id ON challenges (author_id);
+CREATE INDEX IF NOT EXISTS challenges_category ON challenges (category, challenge_id);
+CREATE INDEX IF NOT EXISTS solvers_member_id ON solvers (member_id);
@@ -0,0 +1,41 @@
+-- token buckets for -flag, shared by every bot replica (see src/ratelimit.py)
+CREATE TABLE IF NOT EXISTS rate_limits (
+  bucket TEXT PRIMARY KEY,
+  tokens DOUBLE PRECISION NOT NULL,
+  updated_on TIMESTAMPTZ NOT NULL
+);
+
+-- Takes one token from every bucket, or from none of them if any is empty.
+-- rates are tokens per second, bursts the bucket sizes. Returns 0 when the
+-- tokens were taken, otherwise the seconds to wait before trying again.
+CREATE OR REPLACE FUNCTION take_tokens(
+  buckets TEXT[], rates DOUBLE PRECISION[], bursts DOUBLE PRECISION[]
+) RETURNS DOUBLE PRECISION AS $$
+DECLARE
+  now_ TIMESTAMPTZ := clock_timestamp();
+  levels DOUBLE PRECISION[] := '{}';
+  available DOUBLE PRECISION;
+  wait DOUBLE PRECISION := 0;
+BEGIN
+  FOR i IN 1 .. array_length(buckets, 1) LOOP
+    INSERT INTO rate_limits (bucket, tokens, updated_on)
+      VALUES (buckets[i], bursts[i], now_)
+      ON CONFLICT (bucket) DO NOTHING;
+    SELECT least(bursts[i], tokens + rates[i] * extract(epoch FROM now_ - updated_on))
+      INTO available
+      FROM rate_limits WHERE bucket = buckets[i] FOR UPDATE;
+    levels := levels || available;
+    IF available < 1 THEN
+      wait := greatest(wait, (1 - available) / rates[i]);
+    END IF;
+  END LOOP;
+
+  FOR i IN 1 .. array_length(buckets, 1) LOOP
+    UPDATE rate_limits
+       SET tokens = levels[i] - CASE WHEN wait = 0 THEN 1 ELSE 0 END,
+           updated_on = now_
+     WHERE bucket = buckets[i];
+  END LOOP;
+  RETURN wait;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,9 @@
+-- announcements queued by any bot worker and sent by worker 0 (see src/announce.py)
+CREATE TABLE IF NOT EXISTS announcements (
+  announcement_id BIGSERIAL PRIMARY KEY,
+  channel_id BIGINT NOT NULL,
+  solve BOOLEAN NOT NULL DEFAULT false,
+  content TEXT,
+  embed JSONB,
+  queued_on TIMESTAMPTZ NOT NULL DEFAULT now()
+);
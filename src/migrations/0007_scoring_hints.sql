@@ -0,0 +1,191 @@
+-- dynamic scoring: a challenge is worth `points` to its first solver and
+-- decays to `min_points` after `decay` solves. Each solver keeps the value
+-- they solved at, so a solve only ever touches its own rows.
+ALTER TABLE challenges
+  ADD COLUMN IF NOT EXISTS points INT NOT NULL DEFAULT 500,
+  ADD COLUMN IF NOT EXISTS min_points INT NOT NULL DEFAULT 100,
+  ADD COLUMN IF NOT EXISTS decay INT NOT NULL DEFAULT 30,
+  ADD COLUMN IF NOT EXISTS solve_count INT NOT NULL DEFAULT 0;
+ALTER TABLE solvers ADD COLUMN IF NOT EXISTS points INT NOT NULL DEFAULT 0;
+ALTER TABLE members ADD COLUMN IF NOT EXISTS score INT NOT NULL DEFAULT 0;
+
+-- value of a challenge for its next solver, after `solves` earlier ones
+CREATE OR REPLACE FUNCTION challenge_value(
+  points INT, min_points INT, decay INT, solves INT
+) RETURNS INT AS $$
+  SELECT CASE
+    WHEN decay <= 0 THEN points
+    ELSE GREATEST(
+      min_points,
+      ceil(points - (points - min_points) * (solves::FLOAT8 / decay) ^ 2)::INT
+    )
+  END
+$$ LANGUAGE sql IMMUTABLE;
+
+-- hints are released at `release_on`, or unlocked by a member for `cost` points
+CREATE TABLE IF NOT EXISTS hints (
+  hint_id SERIAL PRIMARY KEY,
+  challenge_id INT NOT NULL REFERENCES challenges(challenge_id) ON DELETE CASCADE,
+  body TEXT NOT NULL,
+  cost INT NOT NULL DEFAULT 0,
+  release_on TIMESTAMP,
+  released_on TIMESTAMP,
+  added_on TIMESTAMP NOT NULL,
+  message_id BIGINT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS hints_challenge_id ON hints (challenge_id);
+-- hints still waiting for their release time, loaded by the bot at startup
+CREATE INDEX IF NOT EXISTS hints_pending ON hints (release_on)
+  WHERE release_on IS NOT NULL AND released_on IS NULL;
+
+CREATE TABLE IF NOT EXISTS hint_unlocks (
+  hint_id INT NOT NULL REFERENCES hints(hint_id) ON DELETE CASCADE,
+  member_id BIGINT NOT NULL REFERENCES members(member_id),
+  cost INT NOT NULL,
+  unlocked_on TIMESTAMP NOT NULL,
+  PRIMARY KEY (hint_id, member_id)
+);
+
+-- Recomputes solve counts, solve values and scores from scratch. Only used
+-- here and after an event import, the bot keeps them up to date per solve.
+CREATE OR REPLACE FUNCTION rebuild_scores() RETURNS VOID AS $$
+BEGIN
+  UPDATE solvers AS s
+     SET points = challenge_value(c.points, c.min_points, c.decay, o.earlier::INT)
+    FROM (
+      SELECT challenge_id, member_id,
+             row_number() OVER (
+               PARTITION BY challenge_id ORDER BY solved_on, member_id
+             ) - 1 AS earlier
+        FROM solvers
+    ) AS o, challenges AS c
+   WHERE o.challenge_id = s.challenge_id
+     AND o.member_id = s.member_id
+     AND c.challenge_id = s.challenge_id;
+
+  UPDATE challenges AS c
+     SET solve_count = (SELECT count(*) FROM solvers AS s WHERE s.challenge_id = c.challenge_id);
+
+  UPDATE members AS m
+     SET score = COALESCE((SELECT sum(points) FROM solvers AS s WHERE s.member_id = m.member_id), 0)
+               - COALESCE((SELECT sum(cost) FROM hint_unlocks AS u WHERE u.member_id = m.member_id), 0);
+END
+$$ LANGUAGE plpgsql;
+
+SELECT rebuild_scores();
+
+-- Records a correct flag in one round trip. Locking the challenge row puts
+-- concurrent solvers in order, so each is scored at its own solve count.
+CREATE OR REPLACE FUNCTION record_solve(
+  chal INT, hashed_flag TEXT, member BIGINT, solved_at TIMESTAMP, message BIGINT,
+  OUT correct BOOLEAN, OUT first_solve BOOLEAN, OUT points INT
+) AS $$
+DECLARE
+  c challenges%ROWTYPE;
+BEGIN
+  first_solve := false;
+  points := 0;
+  correct := EXISTS (
+    SELECT 1 FROM flags WHERE challenge_id = chal AND flag = hashed_flag
+  );
+  IF NOT correct THEN
+    RETURN;
+  END IF;
+
+  SELECT * INTO c FROM challenges WHERE challenge_id = chal FOR UPDATE;
+  points := challenge_value(c.points, c.min_points, c.decay, c.solve_count);
+
+  INSERT INTO solvers (challenge_id, member_id, solved_on, message_id_on_success, points)
+    VALUES (chal, member, solved_at, message, points)
+    ON CONFLICT (challenge_id, member_id) DO NOTHING;
+  first_solve := FOUND;
+  IF NOT first_solve THEN
+    points := 0;
+    RETURN;
+  END IF;
+
+  UPDATE challenges SET solve_count = solve_count + 1 WHERE challenge_id = chal;
+  UPDATE members SET score = score + points WHERE member_id = member;
+END
+$$ LANGUAGE plpgsql;
+
+-- Shows a hint to a member, charging its cost the first time. status is one
+-- of 'missing', 'pending' (waits for its release time), 'unregistered',
+-- 'poor' (not enough points), 'free', 'unlocked' (earlier) or 'charged'.
+CREATE OR REPLACE FUNCTION unlock_hint(
+  hint INT, member BIGINT, unlocked_at TIMESTAMP,
+  OUT status TEXT, OUT challenge_id INT, OUT body TEXT, OUT cost INT
+) AS $$
+DECLARE
+  h hints%ROWTYPE;
+  balance INT;
+BEGIN
+  SELECT * INTO h FROM hints WHERE hint_id = hint;
+  IF NOT FOUND THEN
+    status := 'missing';
+    RETURN;
+  END IF;
+  challenge_id := h.challenge_id;
+  cost := h.cost;
+
+  IF h.released_on IS NOT NULL OR (h.cost = 0 AND h.release_on IS NULL) THEN
+    status := 'free';
+  ELSIF h.release_on IS NOT NULL THEN
+    status := 'pending';
+    RETURN;
+  ELSIF EXISTS (
+    SELECT 1 FROM hint_unlocks AS u WHERE u.hint_id = hint AND u.member_id = member
+  ) THEN
+    status := 'unlocked';
+  ELSE
+    SELECT score INTO balance FROM members WHERE member_id = member FOR UPDATE;
+    IF NOT FOUND THEN
+      status := 'unregistered';
+      RETURN;
+    ELSIF balance < h.cost THEN
+      status := 'poor';
+      RETURN;
+    END IF;
+    -- a double click waits on the member row lock, then finds the unlock
+    INSERT INTO hint_unlocks (hint_id, member_id, cost, unlocked_on)
+      VALUES (hint, member, h.cost, unlocked_at)
+      ON CONFLICT DO NOTHING;
+    IF NOT FOUND THEN
+      status := 'unlocked';
+    ELSE
+      UPDATE members SET score = score - h.cost WHERE member_id = member;
+      status := 'charged';
+    END IF;
+  END IF;
+  body := h.body;
+END
+$$ LANGUAGE plpgsql;
+
+-- rank by score now, solve count and time break ties
+DROP MATERIALIZED VIEW IF EXISTS scoreboard;
+CREATE MATERIALIZED VIEW scoreboard AS
+  SELECT rank() OVER (
+           ORDER BY m.score DESC, COALESCE(s.solves, 0) DESC, s.last_solve
+         ) AS rank,
+         m.member_id,
+         m.server_nickname,
+         m.score,
+         COALESCE(s.solves, 0) AS solves,
+         s.last_solve,
+         COALESCE(f.first_bloods, 0) AS first_bloods,
+         COALESCE(a.attempts, 0) AS wrong_attempts
+    FROM members AS m
+    LEFT JOIN (
+      SELECT member_id, count(*) AS solves, max(solved_on) AS last_solve
+        FROM solvers GROUP BY member_id
+    ) AS s ON s.member_id = m.member_id
+    LEFT JOIN (
+      SELECT member_id, count(*) AS first_bloods
+        FROM first_bloods GROUP BY member_id
+    ) AS f ON f.member_id = m.member_id
+    LEFT JOIN (
+      SELECT member_id, count(*) AS attempts
+        FROM submissions GROUP BY member_id
+    ) AS a ON a.member_id = m.member_id;
+CREATE UNIQUE INDEX IF NOT EXISTS scoreboard_member_id ON scoreboard (member_id);
+CREATE INDEX IF NOT EXISTS scoreboard_rank ON scoreboard (rank);
@@ -0,0 +1,14 @@
+-- challenges are only listed once published, those from before were published
+ALTER TABLE challenges ADD COLUMN IF NOT EXISTS published_on TIMESTAMP;
+UPDATE challenges SET published_on = added_on WHERE published_on IS NULL;
+
+-- jobs to run at a set time (see src/jobs.py). A job is deleted by the
+-- worker that claims it, so it runs at most once whatever the replica count.
+CREATE TABLE IF NOT EXISTS jobs (
+  job_id BIGSERIAL PRIMARY KEY,
+  kind TEXT NOT NULL,
+  payload JSONB NOT NULL,
+  due_on TIMESTAMPTZ NOT NULL,
+  added_on TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS jobs_due_on ON jobs (due_on);
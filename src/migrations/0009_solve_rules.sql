@@ -0,0 +1,47 @@
+-- Authors can't score their own challenges, and nobody scores one that is
+-- not published yet. status is one of 'wrong', 'author', 'unpublished',
+-- 'solved' (earlier) or 'scored'. The result gains a column, so the
+-- function is dropped and created again.
+DROP FUNCTION IF EXISTS record_solve(INT, TEXT, BIGINT, TIMESTAMP, BIGINT);
+CREATE FUNCTION record_solve(
+  chal INT, hashed_flag TEXT, member BIGINT, solved_at TIMESTAMP, message BIGINT,
+  OUT correct BOOLEAN, OUT first_solve BOOLEAN, OUT points INT, OUT status TEXT
+) AS $$
+DECLARE
+  c challenges%ROWTYPE;
+BEGIN
+  first_solve := false;
+  points := 0;
+  correct := EXISTS (
+    SELECT 1 FROM flags WHERE challenge_id = chal AND flag = hashed_flag
+  );
+  IF NOT correct THEN
+    status := 'wrong';
+    RETURN;
+  END IF;
+
+  SELECT * INTO c FROM challenges WHERE challenge_id = chal FOR UPDATE;
+  IF c.author_id = member THEN
+    status := 'author';
+    RETURN;
+  ELSIF c.published_on IS NULL THEN
+    status := 'unpublished';
+    RETURN;
+  END IF;
+  points := challenge_value(c.points, c.min_points, c.decay, c.solve_count);
+
+  INSERT INTO solvers (challenge_id, member_id, solved_on, message_id_on_success, points)
+    VALUES (chal, member, solved_at, message, points)
+    ON CONFLICT (challenge_id, member_id) DO NOTHING;
+  first_solve := FOUND;
+  IF NOT first_solve THEN
+    points := 0;
+    status := 'solved';
+    RETURN;
+  END IF;
+
+  UPDATE challenges SET solve_count = solve_count + 1 WHERE challenge_id = chal;
+  UPDATE members SET score = score + points WHERE member_id = member;
+  status := 'scored';
+END
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,53 @@
+-- Hints of a challenge that is not published yet are hidden like missing
+-- ones, so nobody pays for or reads a hint before the challenge is out.
+CREATE OR REPLACE FUNCTION unlock_hint(
+  hint INT, member BIGINT, unlocked_at TIMESTAMP,
+  OUT status TEXT, OUT challenge_id INT, OUT body TEXT, OUT cost INT
+) AS $$
+DECLARE
+  h hints%ROWTYPE;
+  balance INT;
+BEGIN
+  SELECT * INTO h FROM hints WHERE hint_id = hint;
+  IF NOT FOUND OR NOT EXISTS (
+    SELECT 1 FROM challenges AS c
+      WHERE c.challenge_id = h.challenge_id AND c.published_on IS NOT NULL
+  ) THEN
+    status := 'missing';
+    RETURN;
+  END IF;
+  challenge_id := h.challenge_id;
+  cost := h.cost;
+
+  IF h.released_on IS NOT NULL OR (h.cost = 0 AND h.release_on IS NULL) THEN
+    status := 'free';
+  ELSIF h.release_on IS NOT NULL THEN
+    status := 'pending';
+    RETURN;
+  ELSIF EXISTS (
+    SELECT 1 FROM hint_unlocks AS u WHERE u.hint_id = hint AND u.member_id = member
+  ) THEN
+    status := 'unlocked';
+  ELSE
+    SELECT score INTO balance FROM members WHERE member_id = member FOR UPDATE;
+    IF NOT FOUND THEN
+      status := 'unregistered';
+      RETURN;
+    ELSIF balance < h.cost THEN
+      status := 'poor';
+      RETURN;
+    END IF;
+    -- a double click waits on the member row lock, then finds the unlock
+    INSERT INTO hint_unlocks (hint_id, member_id, cost, unlocked_on)
+      VALUES (hint, member, h.cost, unlocked_at)
+      ON CONFLICT DO NOTHING;
+    IF NOT FOUND THEN
+      status := 'unlocked';
+    ELSE
+      UPDATE members SET score = score - h.cost WHERE member_id = member;
+      status := 'charged';
+    END IF;
+  END IF;
+  body := h.body;
+END
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,111 @@
+#!/bin/env python3
+import asyncio, logging, time
+from collections import namedtuple
+
+from nextcord.ext import commands
+
+log = logging.getLogger(__name__)
+
+# `burst` attempts at once, then one more every `per` seconds
+Limit = namedtuple("Limit", "burst per")
+
+
+class RateLimited(commands.CommandError):
+    """Raised by a command when the author has to wait before trying again."""
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"Rate limited. Try again in {retry_after:.2f}s")
+
+
+class LocalBackend:
+    """Token buckets kept in this process. Only correct for a single replica."""
+
+    def __init__(self):
+        self.buckets = {}  # bucket -> (tokens, updated_on)
+
+    async def take(self, buckets, limits):
+        now = time.monotonic()
+        levels = []
+        wait = 0.0
+        for bucket, limit in zip(buckets, limits):
+            tokens, updated_on = self.buckets.get(bucket, (limit.burst, now))
+            tokens = min(limit.burst, tokens + (now - updated_on) / limit.per)
+            levels.append(tokens)
+            if tokens < 1:
+                wait = max(wait, (1 - tokens) * limit.per)
+
+        for bucket, tokens in zip(buckets, levels):
+            self.buckets[bucket] = (tokens - (1 if wait == 0 else 0), now)
+        return wait
+
+
+class PostgresBackend:
+    """
+    Token buckets in the `rate_limits` table, shared by every replica.
+
+    A check is one call to the take_tokens() function (migration 0005), which
+    locks and updates all buckets of the check in a single round trip. Every
+    PRUNE_INTERVAL seconds the buckets that have refilled are deleted in the
+    background, a missing row is a full bucket to take_tokens().
+    """
+
+    PRUNE_INTERVAL = 600
+
+    def __init__(self, db):
+        self.db = db
+        self._pruned_on = time.monotonic()
+
+    async def take(self, buckets, limits):
+        now = time.monotonic()
+        if now - self._pruned_on > self.PRUNE_INTERVAL:
+            self._pruned_on = now
+            # untouched this long, a bucket is back to its burst
+            asyncio.create_task(
+                self.prune(max(limit.burst * limit.per for limit in limits))
+            )
+        async with self.db.acquire() as conn:
+            return await conn.fetchval(
+                "SELECT take_tokens($1::TEXT[], $2::FLOAT8[], $3::FLOAT8[])",
+                list(buckets),
+                [1 / limit.per for limit in limits],
+                [float(limit.burst) for limit in limits],
+            )
+
+    async def prune(self, idle):
+        """Delete the buckets nobody took a token from for `idle` seconds."""
+        try:
+            async with self.db.acquire() as conn:
+                status = await conn.execute(
+                    """
+                    DELETE FROM rate_limits
+                        WHERE updated_on < now() - make_interval(secs => $1)
+                    """,
+                    idle,
+                )
+            log.info("pruned rate limit buckets: %s", status)
+        except Exception:
+            log.exception("pruning rate limit buckets failed")
+
+
+class RateLimiter:
+    """
+    Limits flag submissions per user and per (user, challenge).
+
+    An attempt takes a token from both buckets, so guessing on many
+    challenges at once does not multiply a brute-forcer's attempts.
+    """
+
+    def __init__(self, backend, *, user, challenge):
+        self.backend = backend
+        self.user = user
+        self.challenge = challenge
+
+    async def check(self, user_id, challenge_id):
+        """Take a token or raise RateLimited with the time left to wait."""
+        retry_after = await self.backend.take(
+            (f"flag:{user_id}", f"flag:{user_id}:{challenge_id}"),
+            (self.user, self.challenge),
+        )
+        if retry_after > 0:
+            raise RateLimited(retry_after)
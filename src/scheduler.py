@@ -0,0 +1,81 @@
+#!/bin/env python3
+import asyncio, heapq, inspect, itertools, logging, re, time
+from datetime import datetime, timedelta
+
+log = logging.getLogger(__name__)
+
+DELAY = re.compile(r"\+(\d+)([mhd])")
+DELAY_UNITS = {"m": "minutes", "h": "hours", "d": "days"}
+
+
+def parse_time(text, now, tz):
+    """
+    Parse a delay after `now` ("+30m", "+2h", "+1d") or a time
+    ("2026-10-18T20:00"). Returns a naive time in `tz`, like `now`; a time
+    with an offset ("2026-10-18T14:15+00:00") is converted. Raises ValueError.
+    """
+    match = DELAY.fullmatch(text)
+    if match:
+        return now + timedelta(**{DELAY_UNITS[match[2]]: int(match[1])})
+    when = datetime.fromisoformat(text)
+    if when.tzinfo is not None:
+        when = when.astimezone(tz).replace(tzinfo=None)
+    return when
+
+
+class Scheduler:
+    """
+    Runs callbacks at set times from a single task and a min-heap.
+
+    However many calls are waiting, there is one sleeping task, woken only
+    when the earliest call is due or an even earlier one is added. Each
+    waiting call costs one heap entry instead of a task sleeping on its own.
+    """
+
+    MAX_SLEEP = 60  # seconds, so a jump of the wall clock is noticed
+
+    def __init__(self):
+        self._heap = []  # (when, sequence, callback, args)
+        self._sequence = itertools.count()  # equal times never compare callbacks
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def call_at(self, when, callback, *args):
+        """Call `callback(*args)` at `when`, a Unix timestamp. Coroutines are awaited."""
+        entry = (when, next(self._sequence), callback, args)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wake.set()  # due before whatever we are sleeping for
+
+    async def _run(self):
+        while True:
+            delay = self._heap[0][0] - time.time() if self._heap else self.MAX_SLEEP
+            if delay > 0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._wake.wait(), min(delay, self.MAX_SLEEP)
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, callback, args = heapq.heappop(self._heap)
+            try:
+                result = callback(*args)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                log.exception("scheduled call %s%r failed", callback.__name__, args)
+
+    def __len__(self):
+        return len(self._heap)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,91 @@
+#!/bin/env python3
+import asyncio, logging
+
+import asyncpg
+
+log = logging.getLogger(__name__)
+
+REFRESH_LOCK = 0x43544643  # pg_advisory_xact_lock key, one refresh at a time
+
+TOP_QUERY = """
+    SELECT rank, member_id, server_nickname, score, solves, last_solve,
+           first_bloods, wrong_attempts
+        FROM scoreboard
+            ORDER BY rank, member_id
+                LIMIT $1
+    """
+MEMBER_QUERY = "SELECT * FROM scoreboard WHERE member_id = $1"
+FIRST_BLOODS_QUERY = """
+    SELECT challenge_id, solved_on
+        FROM first_bloods
+            WHERE member_id = $1
+                ORDER BY solved_on
+    """
+
+
+class Scoreboard:
+    """
+    Reads the `scoreboard` and `first_bloods` materialized views.
+
+    Nothing is aggregated per request: lookups go through the views' indexes.
+    `request_refresh()` is called after solves and submission flushes; the
+    views are then refreshed CONCURRENTLY in the background, at most once
+    every `min_interval` seconds no matter how many solves come in. With
+    several replicas only one refreshes at a time, the others try again later.
+    """
+
+    def __init__(self, db, *, min_interval=10.0):
+        self.db = db
+        self.min_interval = min_interval
+        self._dirty = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def request_refresh(self):
+        self._dirty.set()
+
+    async def _run(self):
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            try:
+                if not await self.refresh():
+                    self._dirty.set()  # our changes may not be in that refresh
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError):
+                log.exception("refreshing the scoreboard failed")
+                self._dirty.set()
+            await asyncio.sleep(self.min_interval)
+
+    async def refresh(self):
+        """Refresh both views. Returns False if another replica is at it."""
+        async with self.db.acquire() as conn:
+            async with conn.transaction():
+                if not await conn.fetchval(
+                    "SELECT pg_try_advisory_xact_lock($1)", REFRESH_LOCK
+                ):
+                    return False
+                # scoreboard counts first bloods, so that view goes first
+                await conn.execute(
+                    "REFRESH MATERIALIZED VIEW CONCURRENTLY first_bloods"
+                )
+                await conn.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY scoreboard")
+        return True
+
+    async def top(self, limit=10):
+        async with self.db.acquire() as conn:
+            return await conn.fetch(TOP_QUERY, limit)
+
+    async def member(self, member_id):
+        """Return (scoreboard row, first bloods) for one member."""
+        async with self.db.acquire() as conn:
+            row = await conn.fetchrow(MEMBER_QUERY, member_id)
+            bloods = await conn.fetch(FIRST_BLOODS_QUERY, member_id)
+        return row, bloods
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
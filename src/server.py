@@ -1,49 +1,232 @@
 #!/bin/env python3
-import os
-from flask import Flask, render_template
-from threading import Thread
-from dotenv import load_dotenv
+import asyncio, hashlib
+from collections import OrderedDict
 from pathlib import Path  # For paths
-from sqlalchemy import create_engine, text
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from aiohttp import web
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+import metrics
 
 cwd = Path(__file__).parents[0]
 cwd = str(cwd)
-load_dotenv(cwd + "/../.env")
 
-DB_URI = os.getenv("DATABASE_URL")
-engine = create_engine(DB_URI, pool_size=5, pool_recycle=3600)
-retrieve_challenges = text(
-    """
-  SELECT m.server_nickname, c.added_on, challenge_id, category, challenge_description FROM challenges as c, members as m WHERE c.author_id=m.member_id;
-  """
+templates = Environment(
+    loader=FileSystemLoader(cwd + "/templates"), autoescape=select_autoescape()
 )
 
-app = Flask(__name__)
+PAGE_SIZE = 24  # challenges per page
+MAX_CACHED_PAGES = 256  # least recently used pages are dropped beyond this
+MAX_ID = 2**31 - 1  # challenge_id is an INT
+
+# NOTIFY channel, sent whenever a challenge is added or published
+CHALLENGES_CHANNEL = "challenges_changed"
+
+# keyset pagination: the next page starts after the last challenge_id shown.
+# One query per case, a generic plan of "$2 IS NULL OR category = $2" can't
+# use challenges_category.
+retrieve_challenges = """
+  SELECT m.server_nickname, c.added_on, c.challenge_id, c.category, c.challenge_description
+    FROM challenges AS c
+    JOIN members AS m ON m.member_id = c.author_id
+   WHERE c.challenge_id > $1
+     AND c.published_on IS NOT NULL
+   ORDER BY c.challenge_id
+   LIMIT $2;
+  """
+retrieve_category_challenges = """
+  SELECT m.server_nickname, c.added_on, c.challenge_id, c.category, c.challenge_description
+    FROM challenges AS c
+    JOIN members AS m ON m.member_id = c.author_id
+   WHERE c.category = $3
+     AND c.challenge_id > $1
+     AND c.published_on IS NOT NULL
+   ORDER BY c.challenge_id
+   LIMIT $2;
+  """
+retrieve_categories = """
+  SELECT DISTINCT category
+    FROM challenges
+   WHERE published_on IS NOT NULL
+   ORDER BY category;
+  """
+# what the /challenges pages show only changes when challenges are published
+retrieve_version = """
+  SELECT count(*) AS published, max(published_on) AS last_published
+    FROM challenges
+   WHERE published_on IS NOT NULL;
+  """
+
+
+class WebServer:
+    """
+    The bot's web pages, served by aiohttp on the bot's own event loop.
+
+    Pages read through the bot's connection pool. Rendered /challenges pages
+    are cached per (category, after) until `challenges_changed()` is called
+    on any replica, only for categories that exist and pages with challenges.
+    Their ETag and Last-Modified come from the published challenges, so
+    every replica sends the same ones.
+    """
+
+    def __init__(self, db, scoreboard, tz, host="0.0.0.0", port=1337):
+        self.db = db
+        self.scoreboard = scoreboard
+        self.tz = tz  # of the naive timestamps in the database
+        self.host = host
+        self.port = port
+        self.runner = None
+
+        self._cache = OrderedDict()  # key -> html, least recently used first
+        self._rendering = {}  # key -> task, so concurrent misses render once
+        self._version = None  # part of the ETag, see challenges()
+        self._last_modified = None  # both set by load_version()
+
+        self.app = web.Application()
+        self.app.add_routes(
+            [
+                web.get("/", self.home),
+                web.get("/challenges", self.challenges),
+                web.get("/scoreboard", self.scoreboard_page),
+                web.get("/metrics", self.metrics),
+                web.static("/static", cwd + "/static"),
+            ]
+        )
+
+    async def challenges_changed(self):
+        """Drop the cached /challenges pages of every replica."""
+        await self.db.notify(CHALLENGES_CHANNEL)
+
+    async def load_version(self):
+        async with self.db.acquire() as conn:
+            row = await conn.fetchrow(retrieve_version)
+        last_published = row["last_published"]
+        if last_published is None:  # nothing published yet
+            self._last_modified = datetime.fromtimestamp(0, timezone.utc)
+        else:
+            self._last_modified = self.tz.localize(last_published).astimezone(
+                timezone.utc
+            )
+        self._version = f"{row['published']}.{int(self._last_modified.timestamp())}"
+
+    async def invalidate_challenges(self):
+        self._cache.clear()
+        self._rendering.clear()
+        await self.load_version()
+
+    def _on_notify(self, payload):
+        asyncio.create_task(self.invalidate_challenges())
+
+    async def render_challenges(self, category, after):
+        async with self.db.acquire() as conn:
+            if category is None:
+                rows = await conn.fetch(retrieve_challenges, after, PAGE_SIZE + 1)
+            else:
+                rows = await conn.fetch(
+                    retrieve_category_challenges, after, PAGE_SIZE + 1, category
+                )
+            categories = [
+                row["category"] for row in await conn.fetch(retrieve_categories)
+            ]
+
+        # one extra row tells us whether there is a next page
+        next_after = (
+            rows[PAGE_SIZE - 1]["challenge_id"] if len(rows) > PAGE_SIZE else None
+        )
+        html = templates.get_template("challenges.html").render(
+            challenges=rows[:PAGE_SIZE],
+            categories=categories,
+            category=category,
+            next_after=next_after,
+        )
+        # made up query strings are rendered, but not kept
+        cacheable = (category is None or category in categories) and (
+            after == 0 or bool(rows)
+        )
+        return html, cacheable
+
+    def not_modified(self, request, etag):
+        if_none_match = request.if_none_match
+        if if_none_match:
+            return any(tag.value == etag for tag in if_none_match)
 
+        since = request.headers.get("If-Modified-Since")
+        if since:
+            try:
+                return self._last_modified <= parsedate_to_datetime(since)
+            except (TypeError, ValueError):
+                return False
+        return False
 
-@app.route("/")
-def home():
-    return "Bot is working!"
+    async def home(self, request):
+        return web.Response(text="Bot is working!")
 
+    async def challenges(self, request):
+        category = request.query.get("category") or None
+        try:
+            after = min(max(int(request.query.get("after", 0)), 0), MAX_ID)
+        except ValueError:
+            after = 0
+        key = (category, after)
 
-@app.route("/challenges")
-def challenges():
-    with engine.connect() as conn:
-        challenges = conn.execute(retrieve_challenges)
-    return render_template("challenges.html", challenges=challenges)
+        # the category is whatever the client sent, keep it out of the header
+        page = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+        etag = f"{self._version}-{page}"
+        headers = {
+            "ETag": f'W/"{etag}"',
+            "Last-Modified": format_datetime(self._last_modified, usegmt=True),
+            "Cache-Control": "no-cache",  # always revalidate, a 304 is cheap
+        }
+        if self.not_modified(request, etag):
+            return web.Response(status=304, headers=headers)
 
+        html = self._cache.get(key)
+        if html is not None:
+            self._cache.move_to_end(key)
+        else:
+            version = self._version
+            task = self._rendering.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self.render_challenges(category, after))
+                self._rendering[key] = task
+            try:
+                html, cacheable = await asyncio.shield(task)
+            finally:
+                if self._rendering.get(key) is task and task.done():
+                    del self._rendering[key]
+            if cacheable and version == self._version:
+                self._cache[key] = html
+                if len(self._cache) > MAX_CACHED_PAGES:
+                    self._cache.popitem(last=False)
 
-def web_server():
-    try:
-        app.run(host="0.0.0.0", port=1337)
-    except:
-        app.run(host="0.0.0.0", port=1338)
+        return web.Response(text=html, content_type="text/html", headers=headers)
 
+    async def scoreboard_page(self, request):
+        rows = await self.scoreboard.top(100)
+        html = templates.get_template("scoreboard.html").render(rows=rows)
+        return web.Response(text=html, content_type="text/html")
 
-def server_thread():
-    t = Thread(target=web_server)
-    t.start()
+    async def metrics(self, request):
+        return web.Response(
+            text=metrics.render(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
 
+    async def start(self):
+        await self.load_version()
+        await self.db.listen(
+            CHALLENGES_CHANNEL,
+            self._on_notify,
+            on_reconnect=self.invalidate_challenges,
+        )
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
 
-if __name__ == "__main__":
-    web_server()
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None